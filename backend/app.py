@@ -1,11 +1,12 @@
 from datetime import datetime
 import os
 import json
+import time
 import uuid
+import queue
 from flask_cors import CORS
 import logging
-import threading
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
@@ -14,8 +15,13 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import modules - remove unused imports
-from modules.database import get_job, update_job_status, get_jobs, create_job
-from modules.job_processor import process_job
+from modules.database import get_job, get_job_status as get_shared_status, update_job, update_job_status, create_job, delete_job, get_cache_stats, list_jobs, subscribe, unsubscribe, start_archival
+from modules.job_store import TERMINAL_STATUSES
+from modules.job_queue import QueueFullError, JobRunningError
+from modules.job_processor import get_result_cache
+from modules.worker import create_job_queue, enqueue_job, settle_flight, recover_orphaned_jobs, flights, JOB_QUEUE_MAX_DEPTH
+from modules.models import job_delta
+from modules import cancellation
 from modules.blender_animator import BlenderAnimator
 
 # Configure logging
@@ -48,6 +54,86 @@ os.makedirs(JOBS_FOLDER, exist_ok=True)
 
 
 
+# Jobs are run by worker processes (python -m modules.worker) fed by a persistent
+# queue; the API only enqueues. At most JOB_QUEUE_MAX_DEPTH jobs may wait before
+# submissions are rejected with 429
+# EMBEDDED_JOB_WORKERS > 0 also runs that many workers inside the API process,
+# for single-process setups such as the journal store
+EMBEDDED_JOB_WORKERS = int(os.environ.get('EMBEDDED_JOB_WORKERS', 0))
+
+job_queue = create_job_queue(workers=EMBEDDED_JOB_WORKERS)
+
+# The debug reloader's parent process never serves requests, so only the
+# process that does (or any WSGI import) runs archival and embedded workers
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    start_archival()
+    if EMBEDDED_JOB_WORKERS > 0:
+        recover_orphaned_jobs(job_queue)
+        job_queue.start()
+
+def queue_full_response(error):
+    """Build the 429 response for a rejected submission."""
+    response = jsonify({
+        "status": "error",
+        "message": "Too many jobs waiting, try again later",
+        "queue_depth": error.depth,
+        "max_queue_depth": error.max_depth
+    })
+    response.headers["Retry-After"] = "30"
+    return response, 429
+
+def submit_job(job_id, prompt, image_id=None, priority=0, force_regenerate=False, bounded=True):
+    """
+    Create a job and put it on the queue, complete it from the result cache,
+    or attach it to an identical job already in flight.
+    
+    Args:
+        bounded (bool): Enforce the queue's maximum depth; False when the
+            caller has already checked the room for the job
+    
+    Returns:
+        dict: {"position": ..., "depth": ..., "coalesced_with": ..., "cached": ...} queue info for the job
+        
+    Raises:
+        QueueFullError: If the queue is saturated; no job is created
+    """
+    # Reject before creating anything when the queue is visibly full
+    if bounded:
+        depth = job_queue.depth()
+        if depth >= JOB_QUEUE_MAX_DEPTH:
+            raise QueueFullError(depth, JOB_QUEUE_MAX_DEPTH)
+    
+    create_job(job_id, prompt, image_id)
+    try:
+        queued = enqueue_job(job_queue, job_id, priority, bounded, force_regenerate)
+    except QueueFullError:
+        # Another submission took the last slot in the meantime
+        delete_job(job_id)
+        raise
+    
+    def record(job):
+        job["priority"] = priority
+        job["queued_at"] = time.time()
+        job["queue_position"] = queued["position"]
+        job["queue_depth"] = queued["depth"]
+    
+    update_job(job_id, record)
+    return queued
+
+def parse_force_regenerate(data):
+    """Read the optional flag that bypasses cached and in-flight results."""
+    value = data.get('force_regenerate', False)
+    if not isinstance(value, bool):
+        raise ValueError("force_regenerate must be a boolean")
+    return value
+
+def parse_priority(data):
+    """Read the optional integer priority of a submission."""
+    try:
+        return int(data.get('priority', 0))
+    except (TypeError, ValueError):
+        raise ValueError("priority must be an integer")
+
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
@@ -133,13 +219,21 @@ def generate():
         # Generate a unique job ID
         job_id = str(uuid.uuid4())
         
-        # Create job in database
-        job = create_job(job_id, prompt)
-        
-        # Start job processing in a separate thread
-        threading.Thread(target=process_job, args=(job_id,)).start()
+        # Create job in database and queue it for processing
+        queued = submit_job(job_id, prompt, priority=parse_priority(data),
+                            force_regenerate=parse_force_regenerate(data))
         
-        return jsonify({"job_id": job_id}), 200
+        return jsonify({
+            "job_id": job_id,
+            "queue_position": queued["position"],
+            "queue_depth": queued["depth"],
+            "coalesced_with": queued["coalesced_with"],
+            "cached": queued["cached"]
+        }), 200
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -157,30 +251,240 @@ def create_new_job():
     prompt = data['prompt']
     image_id = data.get('image_id')
     
+    try:
+        priority = parse_priority(data)
+        force_regenerate = parse_force_regenerate(data)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
     # Generate a unique job ID
     job_id = str(uuid.uuid4())
     
-    # Create a new job in the database
-    create_job(job_id, prompt, image_id)
+    # Create a new job in the database and queue it for processing
+    try:
+        queued = submit_job(job_id, prompt, image_id, priority, force_regenerate)
+    except QueueFullError as e:
+        return queue_full_response(e)
+    
+    return jsonify({
+        "status": "success",
+        "message": "Video served from cache" if queued["cached"] else "Video generation queued",
+        "job_id": job_id,
+        "queue_position": queued["position"],
+        "queue_depth": queued["depth"],
+        "coalesced_with": queued["coalesced_with"],
+        "cached": queued["cached"]
+    })
+
+# Largest number of prompts accepted by POST /api/jobs/batch
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 100))
+
+def parse_batch(data):
+    """
+    Read the submissions of a batch.
+    
+    Returns:
+        list: (prompt, image_id, priority, force_regenerate) per submission
+        
+    Raises:
+        ValueError: If the batch or any of its submissions is invalid
+    """
+    prompts = data.get('prompts') if isinstance(data, dict) else None
+    if not isinstance(prompts, list) or not prompts:
+        raise ValueError("prompts must be a non-empty list")
+    if len(prompts) > MAX_BATCH_SIZE:
+        raise ValueError(f"A batch holds at most {MAX_BATCH_SIZE} prompts")
     
-    # Start the job processing in a separate thread
-    thread = threading.Thread(target=process_job, args=(job_id,))
-    thread.daemon = True
-    thread.start()
+    priority = parse_priority(data)
+    force_regenerate = parse_force_regenerate(data)
+    submissions = []
+    for index, item in enumerate(prompts):
+        if isinstance(item, str):
+            item = {"prompt": item}
+        if not isinstance(item, dict) or not isinstance(item.get('prompt'), str) or not item['prompt'].strip():
+            raise ValueError(f"prompts[{index}] has no prompt")
+        try:
+            submissions.append((
+                item['prompt'],
+                item.get('image_id'),
+                parse_priority(item) if 'priority' in item else priority,
+                parse_force_regenerate(item) if 'force_regenerate' in item else force_regenerate
+            ))
+        except ValueError as e:
+            raise ValueError(f"prompts[{index}]: {e}")
+    return submissions
+
+@app.route('/api/jobs/batch', methods=['POST'])
+def create_job_batch():
+    """
+    Create a video generation job for each prompt of a batch.
+    
+    The body is {"prompts": [...], "priority": ..., "force_regenerate": ...}.
+    Each prompt is a string or an object with its own prompt, image_id,
+    priority and force_regenerate. The batch is accepted or rejected as a
+    whole: it is rejected with 429 unless the queue has room for all of it.
+    """
+    try:
+        submissions = parse_batch(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    
+    depth = job_queue.depth()
+    if depth + len(submissions) > JOB_QUEUE_MAX_DEPTH:
+        return queue_full_response(QueueFullError(depth, JOB_QUEUE_MAX_DEPTH))
+    
+    jobs = []
+    for prompt, image_id, priority, force_regenerate in submissions:
+        job_id = str(uuid.uuid4())
+        # The room for the whole batch was checked above
+        queued = submit_job(job_id, prompt, image_id, priority, force_regenerate, bounded=False)
+        jobs.append({
+            "job_id": job_id,
+            "queue_position": queued["position"],
+            "queue_depth": queued["depth"],
+            "coalesced_with": queued["coalesced_with"],
+            "cached": queued["cached"]
+        })
     
     return jsonify({
         "status": "success",
-        "message": "Video generation started",
-        "job_id": job_id
+        "message": f"{len(jobs)} video generations queued",
+        "jobs": jobs
     })
 
+# Page size limits for GET /api/jobs
+DEFAULT_JOBS_PAGE_SIZE = 50
+MAX_JOBS_PAGE_SIZE = 500
+
 @app.route('/api/jobs', methods=['GET'])
 def get_all_jobs():
-    """Get all jobs."""
-    jobs = get_jobs()
+    """
+    Get a page of jobs, newest first.
+    
+    Query parameters:
+        limit: Page size (default 50, max 500)
+        cursor: next_cursor from the previous page
+        status: Comma-separated statuses to include
+        created_after / created_before: Unix timestamps bounding created_at
+        fields: Comma-separated job fields to return
+    """
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_JOBS_PAGE_SIZE)), MAX_JOBS_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError("limit must be positive")
+        
+        status = request.args.get('status')
+        fields = request.args.get('fields')
+        created_after = request.args.get('created_after')
+        created_before = request.args.get('created_before')
+        
+        page = list_jobs(
+            limit=limit,
+            cursor=request.args.get('cursor'),
+            statuses=status.split(',') if status else None,
+            created_after=float(created_after) if created_after else None,
+            created_before=float(created_before) if created_before else None,
+            fields=fields.split(',') if fields else None
+        )
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+    
     return jsonify({
         "status": "success",
-        "jobs": jobs
+        "jobs": page["jobs"],
+        "next_cursor": page["next_cursor"]
+    })
+
+# Jobs in these statuses can be resumed from their checkpoints
+RESUMABLE_STATUSES = {"error", "cancelled", "canceled"}
+
+class ResumeRejected(Exception):
+    """Raised inside resume_job's update when the job is not in a resumable status."""
+
+@app.route('/api/job/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Re-queue a failed or cancelled job; it restarts from its first incomplete stage."""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    
+    # A cancelled job is still in the queue until its worker has stopped
+    # running it; resuming before that would run it twice at once
+    if job_id in job_queue:
+        return jsonify({
+            "status": "error",
+            "message": "The job is still stopping, try again shortly"
+        }), 409
+    
+    previous_status = job.get("status")
+    
+    def reset(job):
+        nonlocal previous_status
+        # Checked under the job's lock, so concurrent resumes can't both pass
+        previous_status = job.status
+        if previous_status not in RESUMABLE_STATUSES:
+            raise ResumeRejected(previous_status)
+        job["status"] = "pending"
+        job["current_step"] = "Resuming from the last checkpoint"
+        job["error"] = None
+        job["deadline_exceeded"] = None
+        job["resume_count"] = job.get("resume_count", 0) + 1
+        job["queued_at"] = time.time()
+    
+    # Reset before queueing so a worker never picks up the job while it still looks failed
+    try:
+        update_job(job_id, reset)
+    except ResumeRejected:
+        return jsonify({
+            "status": "error",
+            "message": f"Only failed or cancelled jobs can be resumed (status: {previous_status})"
+        }), 400
+    try:
+        queued = job_queue.enqueue(job_id, job.get("priority", 0))
+    except QueueFullError as e:
+        update_job_status(job_id, previous_status, current_step="Resume rejected: job queue is full")
+        return queue_full_response(e)
+    except JobRunningError:
+        update_job_status(job_id, previous_status, current_step="Resume rejected: job is still stopping")
+        return jsonify({
+            "status": "error",
+            "message": "The job is still stopping, try again shortly"
+        }), 409
+    
+    return jsonify({
+        "status": "success",
+        "message": "Job resumed",
+        "job_id": job_id,
+        "checkpoints": sorted(job.get("checkpoints", {})),
+        "queue_position": queued["position"],
+        "queue_depth": queued["depth"]
+    })
+
+@app.route('/api/queue', methods=['GET'])
+def get_queue_stats():
+    """Get the depth of the job queue and the load on its workers."""
+    return jsonify({
+        "status": "success",
+        "queue": job_queue.stats()
+    })
+
+@app.route('/api/stats/job-cache', methods=['GET'])
+def get_job_cache_stats():
+    """Get flush counts and coalescing ratios of the job cache."""
+    return jsonify({
+        "status": "success",
+        "stats": get_cache_stats()
+    })
+
+@app.route('/api/stats/result-cache', methods=['GET'])
+def get_result_cache_stats():
+    """Get the size and hit ratio of the cache of finished results."""
+    return jsonify({
+        "status": "success",
+        "stats": get_result_cache().stats()
     })
 
 @app.route('/api/job/<job_id>', methods=['GET'])
@@ -211,10 +515,27 @@ def get_job_status(job_id):
                     "assets": job.get("assets", []),
                     "video_url": f"/api/video/{job_id}" if job.get("video_ready") else None
                 },
+                "queue_position": job_queue.position(job_id) if job.get("status") == "pending" else None,
+                "queue_wait": job.get("queue_wait"),
+                "coalesced_with": job.get("coalesced_with"),
+                "materialized_from": job.get("materialized_from"),
+                "deadline_exceeded": job.get("deadline_exceeded"),
                 "createdAt": datetime.fromtimestamp(job.get("created_at", 0)).isoformat() if job.get("created_at") else ""
             }
         }
         
+        # A job attached to an identical one reports that job's progress until it gets the result
+        leader_id = job.get("coalesced_with")
+        if leader_id and job.get("status") not in TERMINAL_STATUSES:
+            leader = get_job(leader_id)
+            if leader and leader.get("status") not in TERMINAL_STATUSES:
+                response["job"].update({
+                    "status": leader.get("status", "pending"),
+                    "progress": leader.get("progress", 0),
+                    "current_step": leader.get("current_step", ""),
+                    "steps": leader.get("steps", [])
+                })
+        
         return jsonify(response), 200
     except Exception as e:
         app.logger.error(f"Error getting job status: {str(e)}")
@@ -234,6 +555,68 @@ def get_job_status(job_id):
         return jsonify({"error": str(e)}), 500
 
 
+# Seconds between keep-alive comments on idle event streams
+EVENT_STREAM_KEEPALIVE = 15
+# Seconds between checks for updates made by other processes
+EVENT_STREAM_POLL_INTERVAL = 0.5
+
+@app.route('/api/job/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """
+    Stream a job's status changes as server-sent events.
+    
+    The first event ("snapshot") carries the full job; each following event
+    carries the delta of one committed update. The stream ends once the job
+    reaches a terminal status.
+    """
+    events = queue.Queue()
+    # Subscribe before reading the job so no update can slip in between
+    token = subscribe(lambda changed_id, delta: events.put(delta), job_id)
+    
+    job = get_job(job_id)
+    if not job:
+        unsubscribe(token)
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    
+    def generate():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(job)}\n\n"
+            
+            current = job
+            idle = 0
+            while current.get("status") not in TERMINAL_STATUSES:
+                try:
+                    delta = events.get(timeout=EVENT_STREAM_POLL_INTERVAL)
+                except queue.Empty:
+                    # Updates made by worker processes only show up in the shared status table
+                    shared = get_shared_status(job_id)
+                    if shared and shared["version"] > current.get("version", 0):
+                        latest = get_job(job_id)
+                        if latest:
+                            delta = {"version": latest.get("version", 0), **job_delta(current, latest)}
+                            current = latest
+                            idle = 0
+                            yield f"data: {json.dumps(delta)}\n\n"
+                            continue
+                    
+                    idle += EVENT_STREAM_POLL_INTERVAL
+                    if idle >= EVENT_STREAM_KEEPALIVE:
+                        idle = 0
+                        yield ": keep-alive\n\n"
+                    continue
+                
+                if delta.get("version", 0) <= current.get("version", 0):
+                    continue
+                idle = 0
+                yield f"data: {json.dumps(delta)}\n\n"
+                current = get_job(job_id) or current
+        finally:
+            unsubscribe(token)
+    
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
 @app.route('/api/video/<job_id>', methods=['GET'])
 def get_video(job_id):
     """Get a video for a job."""
@@ -319,44 +702,44 @@ def get_script(job_id):
         app.logger.error(f"Error getting script: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/api/job/<job_id>/cancel', methods=['POST'])
 @app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
 def cancel_job(job_id):
-    try:
-        job = get_job(job_id)
-        if not job:
-            return jsonify({"error": "Job not found"}), 404
-        
-        # Update job status to cancelled
-        from modules.database import update_job_status
-        updated_job = update_job_status(
-            job_id, 
-            status="cancelled",
-            current_step="Job cancelled by user"
-        )
-        
-        return jsonify(updated_job), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    """Cancel a job."""
+    """
+    Cancel a job.
+    
+    A queued job is dropped from the queue. A running job stops at its next
+    cancellation check: its HTTP requests are abandoned and its Blender and
+    ffmpeg processes killed, so its worker picks up the next job right away.
+    """
     try:
         # Get job details
         job = get_job(job_id)
         if not job:
             return jsonify({"status": "error", "message": "Job not found"}), 404
         
-        # Check if job can be canceled
-        if job["status"] in ["completed", "error", "canceled"]:
-            return jsonify({"status": "error", "message": f"Job cannot be canceled (status: {job['status']})"}), 400
+        # Check if job can be cancelled
+        if job["status"] in TERMINAL_STATUSES:
+            return jsonify({"status": "error", "message": f"Job cannot be cancelled (status: {job['status']})"}), 400
+        
+        # Drop it from the queue, or from the identical job it follows, if it hasn't started yet
+        dequeued = job_queue.remove(job_id)
+        flights.leave(job_id)
+        
+        # The status is shared with every process, so a worker elsewhere sees it too
+        update_job_status(job_id, "cancelled", current_step="Job cancelled by user")
+        cancellation.cancel(job_id)
         
-        # Update job status
-        update_job_status(job_id, "canceled")
+        # A job that never started hands its followers on here; a running one does when it stops
+        if dequeued:
+            settle_flight(job_queue, job_id)
         
         return jsonify({
             "status": "success",
-            "message": "Job canceled successfully"
+            "message": "Job cancelled successfully"
         })
     except Exception as e:
-        app.logger.error(f"Error canceling job: {str(e)}")
+        app.logger.error(f"Error cancelling job: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/', methods=['GET'])
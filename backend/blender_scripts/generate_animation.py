@@ -54,7 +54,8 @@ light_object.location = (0, 0, 5)
 
 # Create a text object with the title
 title_data = bpy.data.curves.new(name="Title", type='FONT')
-title_data.body = script_data.get("title", "Video")
+# Per-scene clips after the first are rendered without the title
+title_data.body = script_data.get("title", "Video") if job_config.get("show_title", True) else ""
 title_object = bpy.data.objects.new("Title", title_data)
 scene.collection.objects.link(title_object)
 title_object.location = (0, 0, 2)
@@ -0,0 +1,155 @@
+import os
+import gzip
+import json
+import logging
+import threading
+from typing import Dict, List, Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class JobArchiver:
+    """
+    Cold storage for finished jobs in compressed, append-only segments.
+
+    Each archived job is written to the current segment
+    (segment-NNNNNN.jsonl.gz) as its own gzip member holding one JSON line,
+    so a segment is a regular gzipped JSONL file and any single job can be
+    decompressed on its own. index.jsonl records the segment, byte offset
+    and length of every job; it is loaded into memory at startup and jobs
+    are read back only when asked for. Jobs archived by another process
+    since then are picked up from the index when a lookup misses.
+    """
+
+    def __init__(self, archive_dir: str, segment_max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the JobArchiver.
+
+        Args:
+            archive_dir (str): Directory to store segments and the index
+            segment_max_bytes (int): Size after which a new segment is started
+        """
+        self.archive_dir = archive_dir
+        self.index_file = os.path.join(archive_dir, "index.jsonl")
+        self.segment_max_bytes = segment_max_bytes
+
+        os.makedirs(archive_dir, exist_ok=True)
+
+        self._index: Dict[str, Dict[str, Any]] = {}
+        # Bytes of index.jsonl read into _index so far
+        self._index_offset = 0
+        self._lock = threading.Lock()
+
+        self._load_index()
+
+        logger.info(f"JobArchiver initialized with {len(self._index)} archived jobs in {archive_dir}")
+
+    def _load_index(self) -> None:
+        """Read index entries appended since the last read. Caller holds the lock (or is __init__)."""
+        if not os.path.exists(self.index_file):
+            return
+
+        with open(self.index_file, 'rb') as f:
+            f.seek(self._index_offset)
+            for line in f:
+                # A line still being written is read again next time
+                if not line.endswith(b"\n"):
+                    break
+                entry = json.loads(line)
+                self._index[entry["job_id"]] = entry
+                self._index_offset += len(line)
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _segments(self) -> List[str]:
+        return sorted(
+            f for f in os.listdir(self.archive_dir)
+            if f.startswith("segment-") and f.endswith(".jsonl.gz")
+        )
+
+    def _current_segment(self) -> str:
+        """Get the segment to append to, starting a new one when the last is full."""
+        segments = self._segments()
+        if segments:
+            last = segments[-1]
+            if os.path.getsize(os.path.join(self.archive_dir, last)) < self.segment_max_bytes:
+                return last
+            number = int(last[len("segment-"):-len(".jsonl.gz")]) + 1
+        else:
+            number = 1
+        return f"segment-{number:06d}.jsonl.gz"
+
+    def archive(self, jobs: List[Dict[str, Any]]) -> int:
+        """
+        Append jobs to the archive.
+
+        Args:
+            jobs (list): Full job records
+
+        Returns:
+            int: Number of jobs archived
+        """
+        if not jobs:
+            return 0
+
+        with self._lock:
+            segment = self._current_segment()
+            segment_path = os.path.join(self.archive_dir, segment)
+
+            entries = []
+            with open(segment_path, 'ab') as f:
+                offset = f.tell()
+                for job in jobs:
+                    member = gzip.compress(json.dumps(job, separators=(',', ':')).encode() + b"\n")
+                    f.write(member)
+                    entries.append({
+                        "job_id": job["job_id"],
+                        "segment": segment,
+                        "offset": offset,
+                        "length": len(member)
+                    })
+                    offset += len(member)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Index entries are only written once the data is durable
+            with open(self.index_file, 'a') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._load_index()
+
+        logger.info(f"Archived {len(entries)} jobs to {segment}")
+        return len(entries)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load an archived job.
+
+        Args:
+            job_id (str): The job ID
+
+        Returns:
+            dict: The job record, or None if the job is not archived
+        """
+        entry = self._index.get(job_id)
+        if entry is None:
+            # Another process may have archived the job since we last looked
+            with self._lock:
+                self._load_index()
+                entry = self._index.get(job_id)
+            if entry is None:
+                return None
+
+        with open(os.path.join(self.archive_dir, entry["segment"]), 'rb') as f:
+            f.seek(entry["offset"])
+            member = f.read(entry["length"])
+
+        return json.loads(gzip.decompress(member))
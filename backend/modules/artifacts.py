@@ -0,0 +1,93 @@
+import os
+import hashlib
+import logging
+import tempfile
+from typing import Dict, Any, Iterable, Iterator, Union, BinaryIO
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bytes read and written at a time when streaming an artifact
+ARTIFACT_CHUNK_SIZE = 1024 * 1024
+
+# Artifact contents: bytes, a binary file-like object, or an iterable of bytes chunks
+ArtifactData = Union[bytes, bytearray, memoryview, BinaryIO, Iterable[bytes]]
+
+def iter_chunks(data: ArtifactData, chunk_size: int = ARTIFACT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Iterate over artifact contents in chunks of at most chunk_size bytes.
+
+    Args:
+        data: bytes, a binary file-like object (anything with read()), or an
+            iterable of bytes chunks such as a generator or
+            requests' Response.iter_content()
+        chunk_size (int): Maximum chunk size
+
+    Yields:
+        bytes: The next chunk
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data)
+        for start in range(0, len(view), chunk_size):
+            yield view[start:start + chunk_size]
+    elif hasattr(data, "read"):
+        while True:
+            chunk = data.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for chunk in data:
+            # Split oversized chunks so every write is at most chunk_size
+            if len(chunk) > chunk_size:
+                yield from iter_chunks(chunk, chunk_size)
+            else:
+                yield chunk
+
+def write_artifact(path: str, data: ArtifactData) -> Dict[str, Any]:
+    """
+    Stream artifact contents to a file.
+
+    The data is written in chunks to a temporary file in the destination
+    directory while its SHA-256 is computed, then renamed over path, so the
+    whole artifact is never held in memory and readers never see a partial
+    file.
+
+    Args:
+        path (str): Destination path
+        data: Artifact contents (see iter_chunks)
+
+    Returns:
+        dict: {"path": path, "size": bytes written, "sha256": hex digest}
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter_chunks(data):
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file private to the owner
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    logger.debug(f"Wrote {size} bytes to {path}")
+    return {
+        "path": path,
+        "size": size,
+        "sha256": digest.hexdigest()
+    }
@@ -6,22 +6,41 @@ import base64
 import time
 from io import BytesIO
 from PIL import Image
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+
+from modules.cancellation import JobCancelled
+from modules.job_config import IMAGE_MODEL, IMAGE_PARAMS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AssetGenerator:
-    def __init__(self):
+    def __init__(self, blob_store=None, cancel_token=None, deadline=None):
+        """
+        Initialize the AssetGenerator.
+        
+        Args:
+            blob_store (BlobStore, optional): Store images in this
+                content-addressed store and link them into the job directory
+            cancel_token (CancellationToken, optional): Token of the job the
+                assets are for; cancelling it aborts the API calls in flight
+            deadline (Deadline, optional): Deadline of the job; API calls
+                time out when it runs out
+        """
         logger.info("Initializing AssetGenerator with Stability AI")
+        self.blob_store = blob_store
+        self.cancel_token = cancel_token
+        self.deadline = deadline
+        self.session = requests.Session()
+
         # Set up Stability AI API key
         self.api_key = os.environ.get('STABILITY_API_KEY')
         if not self.api_key:
             logger.warning("STABILITY_API_KEY environment variable not set")
         
         # API endpoint for Stability AI
-        self.api_url = "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image"
+        self.api_url = f"https://api.stability.ai/v1/generation/{IMAGE_MODEL}/text-to-image"
         
         # Headers for API requests
         self.headers = {
@@ -82,6 +101,8 @@ class AssetGenerator:
                 "status": "success",
                 "assets": assets
             }
+        except JobCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error generating assets: {e}")
             return {
@@ -98,35 +119,58 @@ class AssetGenerator:
         
         # Generate an image for each scene
         for i, scene in enumerate(scenes):
-            try:
-                # Get the scene description
-                description = scene.get("description", "")
-                
-                # Generate a prompt for the image
-                prompt = f"Create a high-quality image for a video scene: {description}"
-                
-                logger.info(f"Generating image for scene {i+1}: {description[:50]}...")
-                
-                # Generate the image
-                image_data = self._generate_image_with_stability(prompt)
-                
-                if image_data:
-                    # Save the image
-                    image_name = f"scene_{i+1}.png"
-                    image_path = os.path.join(images_dir, image_name)
-                    
-                    with open(image_path, "wb") as f:
-                        f.write(image_data)
-                    
-                    logger.info(f"Image saved to {image_path}")
-                    image_paths.append(image_path)
-                else:
-                    logger.warning(f"Failed to generate image for scene {i+1}")
-            except Exception as e:
-                logger.error(f"Error generating image for scene {i+1}: {e}")
+            image_path = self.generate_scene_image(images_dir, scene, i)
+            if image_path:
+                image_paths.append(image_path)
         
         return image_paths
     
+    def generate_scene_image(self, images_dir: str, scene: Dict[str, Any], index: int) -> Optional[str]:
+        """
+        Generate the image for a single scene.
+        
+        Args:
+            images_dir (str): Directory to save the image in
+            scene (dict): The scene from the script
+            index (int): Zero-based index of the scene
+            
+        Returns:
+            str: Path to the saved image, or None if no image could be generated
+        """
+        try:
+            # Get the scene description
+            description = scene.get("description", "")
+            
+            # Generate a prompt for the image
+            prompt = f"Create a high-quality image for a video scene: {description}"
+            
+            logger.info(f"Generating image for scene {index+1}: {description[:50]}...")
+            
+            # Generate the image
+            image_data = self._generate_image_with_stability(prompt)
+            
+            if not image_data:
+                logger.warning(f"Failed to generate image for scene {index+1}")
+                return None
+            
+            # Save the image
+            os.makedirs(images_dir, exist_ok=True)
+            image_path = os.path.join(images_dir, f"scene_{index+1}.png")
+            
+            if self.blob_store is not None:
+                self.blob_store.put(image_data, image_path)
+            else:
+                with open(image_path, "wb") as f:
+                    f.write(image_data)
+            
+            logger.info(f"Image saved to {image_path}")
+            return image_path
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating image for scene {index+1}: {e}")
+            return None
+    
     def _generate_image_with_stability(self, prompt: str) -> bytes:
         """Generate an image using Stability AI API."""
         if not self.api_key:
@@ -142,18 +186,15 @@ class AssetGenerator:
                         "weight": 1.0
                     }
                 ],
-                "cfg_scale": 7,
-                "height": 1024,
-                "width": 1024,
-                "samples": 1,
-                "steps": 30
+                **IMAGE_PARAMS
             }
             
             # Make the API request
-            response = requests.post(
+            response = self._post(
                 self.api_url,
                 headers=self.headers,
-                json=payload
+                json=payload,
+                timeout=self._timeout(120)  # Image generation is slow, but must not hang forever
             )
             
             # Check for errors
@@ -171,8 +212,23 @@ class AssetGenerator:
                 return None
                 
         except requests.exceptions.RequestException as e:
+            # A request cut short by the deadline fails the job rather than the image
+            if self.deadline is not None:
+                self.deadline.raise_if_expired()
             logger.error(f"API request failed: {e}")
             return None
+        except JobCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error generating image: {e}")
             return None
+    
+    def _timeout(self, default):
+        """Cap a timeout at the time left to the job's deadline."""
+        return default if self.deadline is None else self.deadline.timeout(default)
+    
+    def _post(self, url: str, **kwargs):
+        """POST through the session, abandoning the request if the job is cancelled."""
+        if self.cancel_token is None:
+            return self.session.post(url, **kwargs)
+        return self.cancel_token.call(self.session.post, url, abort=self.session.close, **kwargs)
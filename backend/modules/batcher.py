@@ -0,0 +1,113 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Any
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """
+    Groups calls made at about the same time into one batched call.
+
+    Callers submit single items and get a Future for each. A collector
+    thread takes the first waiting item, gathers whatever else arrives
+    within max_wait seconds (up to max_batch items), and passes the whole
+    group to the batch function, which returns one result per item. Up to
+    max_concurrent batches are in progress at once, so a slow batch does not
+    hold up the next one.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch: int = 8,
+                 max_wait: float = 0.2, max_concurrent: int = 4, name: str = "batcher"):
+        """
+        Initialize the batcher.
+
+        Args:
+            fn (callable): Batch function; takes a list of items and returns
+                their results in the same order. An exception fails every
+                item of the batch
+            max_batch (int): Largest batch passed to fn
+            max_wait (float): Seconds to wait for more items after the first
+            max_concurrent (int): Batches in progress at once
+            name (str): Name used in thread names and logs
+        """
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._collector = None
+        self._batches = 0
+        self._items = 0
+
+    def submit(self, item: Any) -> Future:
+        """
+        Add an item to the next batch.
+
+        Cancelling the returned future before its batch is sent leaves the
+        item out of the batch.
+
+        Returns:
+            Future: The item's result
+        """
+        future = Future()
+        with self._lock:
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, name=f"{self.name}-collector", daemon=True)
+                self._collector.start()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> None:
+        """Gather waiting items into batches and hand them to the executor."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Drop items whose callers gave up while the batch was forming
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                self._executor.submit(self._run, batch)
+
+    def _run(self, batch: List[tuple]) -> None:
+        """Call the batch function and deliver each item's result."""
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+        logger.info(f"{self.name}: sending a batch of {len(batch)}")
+
+        try:
+            results = self.fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch of {len(batch)} items returned {len(results)} results")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of batches sent and their average size."""
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "average_batch_size": round(self._items / self._batches, 2) if self._batches else 0,
+                "waiting": self._queue.qsize()
+            }
@@ -5,12 +5,28 @@ import logging
 import tempfile
 from pathlib import Path
 
+from modules.cancellation import JobCancelled, run_process
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class BlenderAnimator:
-    def __init__(self):
+    def __init__(self, cancel_token=None, threads=None, deadline=None):
+        """
+        Initialize the BlenderAnimator.
+        
+        Args:
+            cancel_token (CancellationToken, optional): Token of the job being
+                rendered; cancelling it kills the Blender or ffmpeg process group
+            threads (int, optional): Threads each render may use (Blender's
+                -t option); by default Blender uses every core
+            deadline (Deadline, optional): Deadline of the job; Blender and
+                ffmpeg are killed when it runs out
+        """
+        self.cancel_token = cancel_token
+        self.threads = threads
+        self.deadline = deadline
         # Path to Blender executable
         self.blender_path = os.environ.get('BLENDER_PATH', 'blender')
         # Path to Blender script
@@ -74,39 +90,146 @@ class BlenderAnimator:
         Returns:
             dict: Result of the animation creation
         """
+        logger.info(f"Creating animation in {job_dir}")
+        
+        return self._run_blender({
+            "job_dir": job_dir,
+            "script": script_data,
+            "assets": assets_data,
+            "output_file": os.path.join(job_dir, "output.mp4")
+        })
+    
+    def render_scene(self, job_dir, script_data, scene_index, image_path=None):
+        """
+        Render a single scene of a script as its own clip.
+        
+        Args:
+            job_dir (str): Directory for the job
+            script_data (dict): Script data
+            scene_index (int): Zero-based index of the scene to render
+            image_path (str, optional): Image generated for the scene
+            
+        Returns:
+            dict: Result of the render, with the clip's output_path on success
+        """
+        logger.info(f"Rendering scene {scene_index + 1} in {job_dir}")
+        
+        scene_script = dict(script_data)
+        scene_script["scenes"] = [script_data.get("scenes", [])[scene_index]]
+        
+        return self._run_blender({
+            "job_dir": job_dir,
+            "script": scene_script,
+            "assets": {"images": [image_path] if image_path else []},
+            "output_file": os.path.join(job_dir, "scenes", f"scene_{scene_index + 1}.mp4"),
+            "show_title": scene_index == 0
+        })
+    
+    def concat_clips(self, clip_paths, output_path):
+        """
+        Join rendered clips into one video with ffmpeg, without re-encoding.
+        
+        Args:
+            clip_paths (list): Clip paths in playback order
+            output_path (str): Path of the joined video
+            
+        Returns:
+            dict: Result of the concatenation
+        """
         try:
-            logger.info(f"Creating animation in {job_dir}")
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as list_file:
+                for clip_path in clip_paths:
+                    list_file.write(f"file '{os.path.abspath(clip_path)}'\n")
+                list_path = list_file.name
+            
+            # A previous output may be a hard link shared with other jobs; write a new file
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            
+            try:
+                result = run_process(
+                    ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', output_path],
+                    self.cancel_token,
+                    self._timeout()
+                )
+            except subprocess.TimeoutExpired:
+                self.deadline.raise_if_expired()
+                raise
+            finally:
+                os.unlink(list_path)
+            
+            if result.returncode != 0:
+                logger.error(f"ffmpeg error (return code {result.returncode}): {result.stderr}")
+                return {
+                    "status": "error",
+                    "error": f"ffmpeg error: {result.stderr}"
+                }
+            
+            return {
+                "status": "success",
+                "output_path": output_path
+            }
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Error joining clips: {e}")
+            return {
+                "status": "error",
+                "error": str(e)
+            }
+    
+    def _run_blender(self, job_config):
+        """
+        Run the Blender script on a job configuration.
+        
+        Args:
+            job_config (dict): job_dir, script, assets and output_file for the
+                Blender script
+            
+        Returns:
+            dict: Result of the render, with output_path on success
+        """
+        try:
+            output_path = job_config["output_file"]
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
             # Create a temporary file to store the job configuration
             with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False) as temp_file:
-                # Create the job configuration
-                job_config = {
-                    "job_dir": job_dir,
-                    "script": script_data,
-                    "assets": assets_data,
-                    "output_file": os.path.join(job_dir, "output.mp4")
-                }
-                
                 # Write the job configuration to the temporary file
                 json.dump(job_config, temp_file)
                 temp_file_path = temp_file.name
             
             logger.info(f"Job configuration written to {temp_file_path}")
             
+            # A previous run's output may be a hard link shared with other jobs'
+            # outputs; remove it so Blender writes a new file instead of into it
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            
             # Run Blender with the script
             logger.info(f"Running Blender with script {self.blender_script_path}")
             
             # Run Blender with the script
-            result = subprocess.run(
-                [
-                    self.blender_path,
-                    '--background',
-                    '--python', self.blender_script_path,
-                    '--', temp_file_path
-                ],
-                capture_output=True,
-                text=True
-            )
+            try:
+                threads = ['--threads', str(self.threads)] if self.threads else []
+                result = run_process(
+                    [
+                        self.blender_path,
+                        '--background',
+                        *threads,
+                        '--python', self.blender_script_path,
+                        '--', temp_file_path
+                    ],
+                    self.cancel_token,
+                    self._timeout()
+                )
+            except subprocess.TimeoutExpired:
+                os.unlink(temp_file_path)
+                self.deadline.raise_if_expired()
+                raise
+            except JobCancelled:
+                os.unlink(temp_file_path)
+                raise
             
             # Log the Blender output
             logger.info(f"Blender stdout: {result.stdout}")
@@ -122,7 +245,6 @@ class BlenderAnimator:
                 }
             
             # Check if the output file exists
-            output_path = os.path.join(job_dir, "output.mp4")
             if not os.path.exists(output_path):
                 logger.error(f"Output file not found: {output_path}")
                 return {
@@ -137,6 +259,8 @@ class BlenderAnimator:
                 "status": "success",
                 "output_path": output_path
             }
+        except JobCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error creating animation: {e}")
             return {
@@ -144,6 +268,10 @@ class BlenderAnimator:
                 "error": str(e)
             }
     
+    def _timeout(self):
+        """Get the time left to the job's deadline, or None without one."""
+        return None if self.deadline is None else self.deadline.timeout()
+    
     def _create_blender_script(self):
         """Create the Blender script for animation generation."""
         script_content = '''
@@ -202,7 +330,8 @@ light_object.location = (0, 0, 5)
 
 # Create a text object with the title
 title_data = bpy.data.curves.new(name="Title", type='FONT')
-title_data.body = script_data.get("title", "Video")
+# Per-scene clips after the first are rendered without the title
+title_data.body = script_data.get("title", "Video") if job_config.get("show_title", True) else ""
 title_object = bpy.data.objects.new("Title", title_data)
 scene.collection.objects.link(title_object)
 title_object.location = (0, 0, 2)
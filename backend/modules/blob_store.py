@@ -0,0 +1,225 @@
+import os
+import time
+import hashlib
+import logging
+import tempfile
+from typing import Dict, Any
+
+from modules.artifacts import ArtifactData, ARTIFACT_CHUNK_SIZE, write_artifact
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class BlobStore:
+    """
+    Content-addressed store for job artifacts.
+
+    Each distinct piece of content is stored once, as objects/<aa>/<sha256>,
+    and job output paths are hard links to it, so identical images, scripts
+    and videos produced by different jobs share one copy on disk. The link
+    count of an object is its reference count: deleting a job's output
+    directory drops its references, and gc() removes objects nothing links
+    to any more.
+
+    Linked output files must be replaced, never modified in place, since a
+    write through one link changes every job's copy. put() and adopt()
+    always replace the destination atomically.
+    """
+
+    def __init__(self, root: str, gc_grace: float = 3600):
+        """
+        Initialize the BlobStore.
+
+        Args:
+            root (str): Directory for objects; must be on the same filesystem
+                as the job output directories so they can be hard-linked
+            gc_grace (float): Seconds an unreferenced object is kept before
+                gc() may remove it, so a put that is about to link it is not
+                raced
+        """
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.gc_grace = gc_grace
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+        logger.info(f"BlobStore initialized in {root}")
+
+    def blob_path(self, sha256: str) -> str:
+        """Get the object path for a digest."""
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def __contains__(self, sha256: str) -> bool:
+        return os.path.exists(self.blob_path(sha256))
+
+    def refcount(self, sha256: str) -> int:
+        """Get the number of output paths linked to an object."""
+        try:
+            return os.stat(self.blob_path(sha256)).st_nlink - 1
+        except FileNotFoundError:
+            return 0
+
+    def _add(self, path: str, sha256: str) -> str:
+        """
+        Make the file at path the object for sha256, unless one already exists.
+
+        Returns:
+            str: The object path
+        """
+        blob_path = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            os.link(path, blob_path)
+            # Objects are shared; make accidental in-place writes fail
+            os.chmod(blob_path, 0o444)
+        except FileExistsError:
+            pass
+        return blob_path
+
+    def _link(self, blob_path: str, dest_path: str) -> None:
+        """Atomically point dest_path at an object."""
+        directory = os.path.dirname(dest_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".link-{os.getpid()}-{time.monotonic_ns()}")
+        os.link(blob_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    def put(self, data: ArtifactData, dest_path: str) -> Dict[str, Any]:
+        """
+        Store content and link it at dest_path.
+
+        bytes are hashed before anything is written, so content the store
+        already holds costs no data write at all. Streams are spooled to a
+        temporary file while hashed and discarded if the content is known.
+
+        Args:
+            data: bytes, a binary file-like object or an iterable of bytes chunks
+            dest_path (str): Output path to link the content at
+
+        Returns:
+            dict: {"path": dest_path, "size": bytes, "sha256": hex digest}
+        """
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            sha256 = hashlib.sha256(data).hexdigest()
+            size = len(data)
+            if sha256 not in self:
+                spooled = write_artifact(self._tmp_path(), data)
+                self._add(spooled["path"], sha256)
+                os.remove(spooled["path"])
+        else:
+            spooled = write_artifact(self._tmp_path(), data)
+            sha256, size = spooled["sha256"], spooled["size"]
+            self._add(spooled["path"], sha256)
+            os.remove(spooled["path"])
+
+        self._link_or_restore(sha256, dest_path, data)
+        return {"path": dest_path, "size": size, "sha256": sha256}
+
+    def adopt(self, path: str) -> Dict[str, Any]:
+        """
+        Move an existing file (e.g. a render written by Blender) into the store.
+
+        The file becomes the object if its content is new; otherwise it is
+        replaced by a link to the existing copy and its disk space is freed.
+
+        Args:
+            path (str): Path of the file
+
+        Returns:
+            dict: {"path": path, "size": bytes, "sha256": hex digest}
+        """
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(ARTIFACT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+
+        blob_path = self._add(path, sha256)
+        if not os.path.samefile(blob_path, path):
+            self._link(blob_path, path)
+        return {"path": path, "size": size, "sha256": sha256}
+
+    def link(self, sha256: str, dest_path: str) -> Dict[str, Any]:
+        """
+        Link content the store already holds at another output path.
+
+        Args:
+            sha256 (str): Digest of the content
+            dest_path (str): Output path to link it at
+
+        Returns:
+            dict: {"path": dest_path, "size": bytes, "sha256": sha256}
+
+        Raises:
+            FileNotFoundError: If the store doesn't hold the content
+        """
+        blob_path = self.blob_path(sha256)
+        size = os.stat(blob_path).st_size
+        self._link(blob_path, dest_path)
+        return {"path": dest_path, "size": size, "sha256": sha256}
+
+    def _tmp_path(self) -> str:
+        fd, path = tempfile.mkstemp(dir=self.tmp_dir)
+        os.close(fd)
+        return path
+
+    def _link_or_restore(self, sha256: str, dest_path: str, data: ArtifactData) -> None:
+        """Link an object at dest_path, re-adding it if gc() removed it meanwhile."""
+        try:
+            self._link(self.blob_path(sha256), dest_path)
+        except FileNotFoundError:
+            if not isinstance(data, (bytes, bytearray, memoryview)):
+                raise
+            spooled = write_artifact(self._tmp_path(), data)
+            self._add(spooled["path"], sha256)
+            os.remove(spooled["path"])
+            self._link(self.blob_path(sha256), dest_path)
+
+    def gc(self) -> int:
+        """
+        Remove objects no output path links to any more.
+
+        Returns:
+            int: Number of objects removed
+        """
+        removed = 0
+        cutoff = time.time() - self.gc_grace
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                blob_path = os.path.join(prefix_dir, name)
+                try:
+                    stat = os.stat(blob_path)
+                    # Linking updates ctime, so a recently linked object is never collected
+                    if stat.st_nlink == 1 and stat.st_ctime < cutoff:
+                        os.remove(blob_path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+
+        if removed:
+            logger.info(f"Removed {removed} unreferenced blobs")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of objects, their total size and the number of links to them."""
+        blobs = size = links = 0
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                try:
+                    stat = os.stat(os.path.join(prefix_dir, name))
+                except FileNotFoundError:
+                    continue
+                blobs += 1
+                size += stat.st_size
+                links += stat.st_nlink - 1
+        return {"blobs": blobs, "bytes": size, "links": links}
@@ -0,0 +1,276 @@
+import os
+import signal
+import logging
+import threading
+import subprocess
+from typing import Callable, Dict, List, Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds a cancelled process group gets to exit after SIGTERM before SIGKILL
+KILL_GRACE_PERIOD = 5
+
+class JobCancelled(Exception):
+    """Raised inside a job's pipeline once the job has been cancelled."""
+
+class CancellationToken:
+    """
+    Cancellation flag for one running job.
+
+    Code running the job checks the token between steps (raise_if_cancelled,
+    wait) and registers callbacks that abort blocking work (killing a
+    subprocess, abandoning an HTTP request) while that work is in progress.
+    Callbacks registered after cancellation run immediately.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: Dict[int, Callable[[], None]] = {}
+        self._next_handle = 0
+        self._reason: Optional[JobCancelled] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: Optional[JobCancelled] = None) -> None:
+        """
+        Cancel the job and run the registered abort callbacks.
+
+        Args:
+            reason (JobCancelled, optional): Exception raised in the job's
+                pipeline instead of a plain JobCancelled, e.g. DeadlineExceeded
+        """
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+
+        logger.info(f"Cancelling job {self.job_id}")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error aborting work for job {self.job_id}: {e}")
+
+    def raise_if_cancelled(self) -> None:
+        """Raise JobCancelled (or the reason given to cancel) if the job has been cancelled."""
+        if self._event.is_set():
+            raise self._reason or JobCancelled(f"Job {self.job_id} was cancelled")
+
+    def wait(self, seconds: float) -> None:
+        """Sleep for up to seconds, raising JobCancelled as soon as the job is cancelled."""
+        if self._event.wait(seconds):
+            self.raise_if_cancelled()
+
+    def on_cancel(self, callback: Callable[[], None]) -> int:
+        """
+        Register a callback to run when the job is cancelled.
+
+        Returns:
+            int: Handle to pass to remove_callback once the work is done
+        """
+        with self._lock:
+            if not self._event.is_set():
+                handle = self._next_handle
+                self._next_handle += 1
+                self._callbacks[handle] = callback
+                return handle
+        callback()
+        return -1
+
+    def remove_callback(self, handle: int) -> None:
+        with self._lock:
+            self._callbacks.pop(handle, None)
+
+    def call(self, fn: Callable[..., Any], *args, abort: Optional[Callable[[], None]] = None, **kwargs) -> Any:
+        """
+        Run a blocking call that returns as soon as the job is cancelled.
+
+        The call runs in a helper thread while this thread waits for either
+        its result or cancellation. On cancellation abort is called (e.g. to
+        close the HTTP session), the call's eventual result is discarded and
+        JobCancelled is raised straight away, so the caller's worker is free
+        without waiting for the remote end.
+
+        Args:
+            fn (callable): The blocking call
+            abort (callable, optional): Called on cancellation to stop the call
+
+        Returns:
+            The call's return value
+        """
+        self.raise_if_cancelled()
+
+        done = threading.Event()
+        outcome: List[Any] = [None, None]
+
+        def run():
+            try:
+                outcome[0] = fn(*args, **kwargs)
+            except BaseException as e:
+                outcome[1] = e
+            finally:
+                done.set()
+
+        handle = self.on_cancel(done.set)
+        try:
+            threading.Thread(target=run, daemon=True).start()
+            done.wait()
+        finally:
+            self.remove_callback(handle)
+
+        if self.cancelled:
+            if abort is not None:
+                try:
+                    abort()
+                except Exception as e:
+                    logger.error(f"Error aborting call for job {self.job_id}: {e}")
+            self.raise_if_cancelled()
+        if outcome[1] is not None:
+            raise outcome[1]
+        return outcome[0]
+
+
+def _terminate(process: subprocess.Popen) -> None:
+    """Terminate a process started in its own session, along with its children."""
+    if process.poll() is not None:
+        return
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+        try:
+            process.wait(KILL_GRACE_PERIOD)
+        except subprocess.TimeoutExpired:
+            if hasattr(os, "killpg"):
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+    except ProcessLookupError:
+        pass
+
+def run_process(args: List[str], token: Optional[CancellationToken] = None,
+                timeout: Optional[float] = None, **kwargs) -> subprocess.CompletedProcess:
+    """
+    Run a command like subprocess.run with capture_output=True and text=True,
+    killing its whole process group if the token is cancelled or the
+    timeout expires.
+
+    The command runs in a new session, so cancellation also reaches any
+    processes it spawned (Blender's ffmpeg encoder, for instance).
+
+    Args:
+        args (list): The command
+        token (CancellationToken, optional): Token of the job running the command
+        timeout (float, optional): Seconds to wait for the command
+
+    Returns:
+        subprocess.CompletedProcess: The finished process
+
+    Raises:
+        JobCancelled: If the job was cancelled before or while the command ran
+        subprocess.TimeoutExpired: If the command was killed for running too long
+    """
+    if token is not None:
+        token.raise_if_cancelled()
+
+    process = subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+        **kwargs
+    )
+    handle = token.on_cancel(lambda: _terminate(process)) if token is not None else None
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        _terminate(process)
+        process.communicate()
+        if token is not None:
+            token.raise_if_cancelled()
+        raise
+    finally:
+        if handle is not None:
+            token.remove_callback(handle)
+
+    if token is not None:
+        token.raise_if_cancelled()
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+
+# Tokens of the jobs running in this process
+_tokens: Dict[str, CancellationToken] = {}
+_tokens_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+
+def register(job_id: str) -> CancellationToken:
+    """Create the token for a job that is starting to run in this process."""
+    with _tokens_lock:
+        token = _tokens[job_id] = CancellationToken(job_id)
+    return token
+
+def release(job_id: str, token: CancellationToken) -> None:
+    """
+    Forget a job's token once the run it belongs to has stopped.
+
+    A later run of the same job may have registered its own token in the
+    meantime; that one is kept, so the later run can still be cancelled.
+    """
+    with _tokens_lock:
+        if _tokens.get(job_id) is token:
+            del _tokens[job_id]
+
+def cancel(job_id: str) -> bool:
+    """
+    Cancel a job running in this process.
+
+    Returns:
+        bool: True if the job was running here
+    """
+    with _tokens_lock:
+        token = _tokens.get(job_id)
+    if token is None:
+        return False
+    token.cancel()
+    return True
+
+def watch(is_cancelled: Callable[[str], bool], interval: float = 0.5) -> None:
+    """
+    Poll for jobs cancelled from other processes.
+
+    Starts a background thread (once per process) that checks every running
+    job with is_cancelled(job_id) and cancels the tokens of those that are.
+
+    Args:
+        is_cancelled (callable): Cheap check of a job's cancelled state
+        interval (float): Seconds between checks
+    """
+    global _watcher
+
+    def loop():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            with _tokens_lock:
+                running = [token for token in _tokens.values() if not token.cancelled]
+            for token in running:
+                try:
+                    if is_cancelled(token.job_id):
+                        token.cancel()
+                except Exception as e:
+                    logger.error(f"Error checking cancellation of job {token.job_id}: {e}")
+
+    with _tokens_lock:
+        if _watcher is None:
+            _watcher = threading.Thread(target=loop, name="cancellation-watcher", daemon=True)
+            _watcher.start()
@@ -1,59 +1,253 @@
 import os
 import json
 import time
+import base64
+import shutil
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+from typing import Callable, Dict, List, Any, Optional
+
+from modules.events import StatusBroadcaster
+from modules.models import Job, job_delta
+from modules.archiver import JobArchiver
+from modules.blob_store import BlobStore
+from modules.file_lock import FileLock, StripedFileLock
+from modules.shared_status import SharedStatusTable
+from modules.job_store import CachedJobStore, JournalJobStore, SqliteJobStore, SUMMARY_FIELDS, TERMINAL_STATUSES, ACTIVE_STATUSES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Data directory
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+DATA_DIR = os.environ.get('IMAGINEIT_DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data'))
 JOBS_DIR = os.path.join(DATA_DIR, 'jobs')
 JOBS_FILE = os.path.join(DATA_DIR, 'jobs.json')
+DB_FILE = os.path.join(DATA_DIR, 'imagineit.db')
+JOURNAL_DIR = os.path.join(DATA_DIR, 'journal')
+ARCHIVE_DIR = os.path.join(DATA_DIR, 'archive')
+LOCKS_DIR = os.path.join(DATA_DIR, 'locks')
+# Under JOBS_DIR so job outputs can be hard-linked to it
+BLOBS_DIR = os.path.join(JOBS_DIR, '.blobs')
+STATUS_TABLE_FILE = os.path.join(DATA_DIR, 'status.mmap')
+
+# Storage backend: "sqlite" (default) or "json" for the flat-file journal
+JOB_STORE = os.environ.get('JOB_STORE', 'sqlite').lower()
+JOURNAL_COMPACT_INTERVAL = float(os.environ.get('JOURNAL_COMPACT_INTERVAL', 60))
+
+# Seconds between write-behind flushes of cached jobs; 0 writes every update straight through
+JOB_CACHE_FLUSH_INTERVAL = float(os.environ.get('JOB_CACHE_FLUSH_INTERVAL', 1.0))
+
+# Whether several processes share DATA_DIR (the API and its job workers, or
+# several API processes): the job cache then writes through and checks its
+# copies against the shared status table. On by default since jobs run in
+# separate worker processes; the single-process journal store turns it off
+JOB_STORE_SHARED = os.environ.get('JOB_STORE_SHARED', '0' if JOB_STORE == 'json' else '1') == '1'
+STATUS_TABLE_SLOTS = int(os.environ.get('STATUS_TABLE_SLOTS', 65536))
+
+# Per-job update locks are striped so unrelated jobs rarely share a lock; they are
+# file locks so updates are serialized across processes too
+JOB_LOCK_STRIPES = 64
+JOB_UPDATE_RETRIES = 5
+
+# Finished jobs older than this many days are moved to the archive; 0 disables archival
+ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', 30))
+ARCHIVE_INTERVAL = float(os.environ.get('ARCHIVE_INTERVAL', 3600))
+ARCHIVE_BATCH_SIZE = 500
+
+# Jobs interrupted by more restarts than this are failed instead of resumed
+MAX_RECOVERY_ATTEMPTS = int(os.environ.get('MAX_RECOVERY_ATTEMPTS', 2))
+RECOVERY_BATCH_SIZE = 500
 
 # Ensure directories exist
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(JOBS_DIR, exist_ok=True)
 
-# Initialize jobs file if it doesn't exist
-if not os.path.exists(JOBS_FILE):
-    with open(JOBS_FILE, 'w') as f:
-        json.dump([], f)
+_job_locks = StripedFileLock(LOCKS_DIR, JOB_LOCK_STRIPES)
+_status_table = SharedStatusTable(STATUS_TABLE_FILE, STATUS_TABLE_SLOTS)
+
+# Held by the one process that runs archival, and by the one that runs
+# startup recovery. Separate locks, because API processes archive too
+_maintenance_lock = FileLock(os.path.join(LOCKS_DIR, 'maintenance.lock'))
+_recovery_lock = FileLock(os.path.join(LOCKS_DIR, 'recovery.lock'))
+_lock_holders: Dict[str, int] = {}
+_lock_holders_lock = threading.Lock()
+
+def _create_store():
+    """Create the job store selected by the JOB_STORE environment variable."""
+    if JOB_STORE == 'json':
+        if JOB_STORE_SHARED:
+            raise RuntimeError("JOB_STORE_SHARED requires JOB_STORE=sqlite")
+        store = JournalJobStore(JOURNAL_DIR, JOBS_FILE,
+                                legacy_jobs_dir=JOBS_DIR,
+                                compact_interval=JOURNAL_COMPACT_INTERVAL)
+    else:
+        if JOB_STORE != 'sqlite':
+            logger.warning(f"Unknown JOB_STORE '{JOB_STORE}', falling back to sqlite")
+        store = SqliteJobStore(DB_FILE, legacy_jobs_dir=JOBS_DIR)
+
+    if JOB_STORE_SHARED:
+        store = CachedJobStore(store, shared_status=_status_table)
+    elif JOB_CACHE_FLUSH_INTERVAL > 0:
+        store = CachedJobStore(store, flush_interval=JOB_CACHE_FLUSH_INTERVAL)
+    return store
+
+_store = _create_store()
+_archiver = JobArchiver(ARCHIVE_DIR)
+_blob_store = BlobStore(BLOBS_DIR)
+_broadcaster = StatusBroadcaster()
+
+def subscribe(listener: Callable[[str, Dict[str, Any]], None], job_id: Optional[str] = None) -> int:
+    """
+    Register a listener for job changes.
+    
+    The listener is called as listener(job_id, delta) after each committed
+    update, in the updating thread. delta holds the changed fields in the
+    format of models.job_delta plus the new "version"; a newly created job
+    is reported with all of its fields under "set".
+    
+    Args:
+        listener (callable): The listener
+        job_id (str, optional): Only notify about this job
+        
+    Returns:
+        int: Token to pass to unsubscribe
+    """
+    return _broadcaster.subscribe(listener, job_id)
+
+def unsubscribe(token: int) -> bool:
+    """Remove a listener registered with subscribe."""
+    return _broadcaster.unsubscribe(token)
+
+def _claim(name: str, lock: FileLock) -> bool:
+    """Take a lock for the life of this process, without waiting."""
+    with _lock_holders_lock:
+        if _lock_holders.get(name) == os.getpid():
+            return True
+        if lock.acquire(blocking=False):
+            _lock_holders[name] = os.getpid()
+            return True
+        return False
+
+def claim_maintenance() -> bool:
+    """
+    Check whether this process runs archival.
+    
+    The first process to take the maintenance lock keeps it until it exits,
+    so with several processes only one of them moves jobs to the archive.
+    Other processes may take over later if the holder exits.
+    
+    Returns:
+        bool: True if this process holds the maintenance lock
+    """
+    return _claim('maintenance', _maintenance_lock)
+
+def claim_recovery() -> bool:
+    """
+    Check whether this process runs startup recovery.
+    
+    Works like claim_maintenance, with a lock of its own: only processes
+    that run jobs recover them, and the API process's archival thread
+    holding the maintenance lock must not keep them from it.
+    
+    Returns:
+        bool: True if this process holds the recovery lock
+    """
+    return _claim('recovery', _recovery_lock)
+
+def get_job_status(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get a job's status, progress, version and updated_at from the shared
+    status table, without reading the job store.
+    
+    Returns:
+        dict: The shared status, or None if the job isn't in the table
+    """
+    return _status_table.get(job_id)
+
+def _publish_status(job: Dict[str, Any]) -> None:
+    """Share a job's new status with the other processes."""
+    _status_table.put(job["job_id"], job.get("status"), job.get("progress", 0),
+                      job.get("version", 0), job.get("updated_at"))
+
+def get_blob_store() -> BlobStore:
+    """Get the content-addressed store that job outputs are linked from."""
+    return _blob_store
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Get flush counts and coalescing ratios of the job cache."""
+    if isinstance(_store, CachedJobStore):
+        return _store.stats()
+    return {"enabled": False}
 
 def get_jobs() -> List[Dict[str, Any]]:
     """Get all jobs."""
     try:
-        with open(JOBS_FILE, 'r') as f:
-            jobs = json.load(f)
-        return jobs
+        return _store.list()
     except Exception as e:
         logger.error(f"Error getting jobs: {e}")
         return []
 
-def get_job(job_id: str) -> Optional[Dict[str, Any]]:
-    """Get a job by ID."""
+def _encode_cursor(job: Dict[str, Any]) -> str:
+    """Encode the (created_at, job_id) key of a job as an opaque cursor."""
+    key = json.dumps([job.get("created_at") or 0, job["job_id"]])
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor produced by _encode_cursor."""
     try:
-        job_file = os.path.join(JOBS_DIR, f"{job_id}.json")
-        if not os.path.exists(job_file):
-            logger.warning(f"Job file not found: {job_file}")
-            return None
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (float(created_at), str(job_id))
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def list_jobs(limit: int = 50, cursor: Optional[str] = None,
+              statuses: Optional[List[str]] = None,
+              created_after: Optional[float] = None,
+              created_before: Optional[float] = None,
+              fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Get a page of jobs, newest first.
+    
+    Pages are addressed by a (created_at, job_id) keyset cursor, so the cost
+    of a page depends on its size rather than on the number of stored jobs.
+    
+    Args:
+        limit (int): Maximum number of jobs to return
+        cursor (str, optional): next_cursor returned with the previous page
+        statuses (list, optional): Only include jobs with these statuses
+        created_after (float, optional): Only include jobs created at or after this timestamp
+        created_before (float, optional): Only include jobs created before this timestamp
+        fields (list, optional): Job fields to include; job_id is always included.
+            Defaults to the summary fields returned by get_jobs.
         
-        with open(job_file, 'r') as f:
-            job = json.load(f)
-        return job
-    except Exception as e:
-        logger.error(f"Error getting job {job_id}: {e}")
-        return None
+    Returns:
+        dict: {"jobs": [...], "next_cursor": str or None}
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    full = bool(fields) and not set(fields) <= set(SUMMARY_FIELDS)
+    
+    jobs = _store.page(limit, after, statuses, created_after, created_before, full)
+    
+    next_cursor = _encode_cursor(jobs[-1]) if len(jobs) == limit else None
+    if fields:
+        keep = set(fields) | {"job_id"}
+        jobs = [{key: value for key, value in job.items() if key in keep} for job in jobs]
+    
+    return {
+        "jobs": jobs,
+        "next_cursor": next_cursor
+    }
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
     """Get a job by ID."""
     try:
-        job_file = os.path.join(JOBS_DIR, f"{job_id}.json")
-        if not os.path.exists(job_file):
-            return None
-        
-        with open(job_file, 'r') as f:
-            job = json.load(f)
+        job = _store.get(job_id)
+        if job is None:
+            # Finished jobs may have been moved to the archive
+            job = _archiver.get(job_id)
+        if job is None:
+            logger.warning(f"Job not found: {job_id}")
         return job
     except Exception as e:
         logger.error(f"Error getting job {job_id}: {e}")
@@ -63,62 +257,12 @@ def create_job(job_id: str, prompt: str, image_id: Optional[str] = None) -> Dict
     """Create a new job."""
     try:
         # Create job data
-        job = {
-            "job_id": job_id,
-            "prompt": prompt,
-            "image_id": image_id,
-            "created_at": time.time(),
-            "updated_at": time.time(),
-            "status": "pending",
-            "progress": 0,
-            "current_step": "Job created, waiting to start",
-            "steps": [
-                {
-                    "name": "script_generation",
-                    "status": "pending",
-                    "progress": 0,
-                    "message": "Waiting to start"
-                },
-                {
-                    "name": "asset_generation",
-                    "status": "pending",
-                    "progress": 0,
-                    "message": "Waiting for script generation"
-                },
-                {
-                    "name": "animation",
-                    "status": "pending",
-                    "progress": 0,
-                    "message": "Waiting for asset generation"
-                },
-                {
-                    "name": "rendering",
-                    "status": "pending",
-                    "progress": 0,
-                    "message": "Waiting for animation"
-                }
-            ],
-            "output": {}
-        }
-        
-        # Save job to file
-        job_file = os.path.join(JOBS_DIR, f"{job_id}.json")
-        with open(job_file, 'w') as f:
-            json.dump(job, f, indent=2)
-        
-        # Add job to jobs list
-        jobs = get_jobs()
-        jobs.append({
-            "job_id": job_id,
-            "prompt": prompt,
-            "created_at": job["created_at"],
-            "status": job["status"],
-            "progress": job["progress"]
-        })
+        job = Job.new(job_id, prompt, image_id, time.time()).to_dict()
         
-        # Save jobs list
-        with open(JOBS_FILE, 'w') as f:
-            json.dump(jobs, f, indent=2)
+        # Save job
+        _store.insert(job)
+        _publish_status(job)
+        _broadcaster.publish(job_id, {"version": job["version"], "set": job})
         
         logger.info(f"Created job {job_id} with prompt: {prompt}")
         return job
@@ -126,64 +270,108 @@ def create_job(job_id: str, prompt: str, image_id: Optional[str] = None) -> Dict
         logger.error(f"Error creating job: {e}")
         raise
 
-def update_job_status(job_id: str, status: Optional[str] = None, **kwargs) -> Dict[str, Any]:
-    """Update job status."""
-    try:
-        # Get job
-        job_file = os.path.join(JOBS_DIR, f"{job_id}.json")
-        if not os.path.exists(job_file):
-            raise ValueError(f"Job {job_id} not found")
-        
-        with open(job_file, 'r') as f:
-            job = json.load(f)
-        
-        # Update job status
-        if status:
-            job["status"] = status
-        
-        # Update job fields
-        for key in ["progress", "current_step", "error"]:
-            if key in kwargs:
-                job[key] = kwargs[key]
+def _remove_job_files(job_id: str) -> None:
+    """
+    Remove a job's directory under JOBS_DIR.
+
+    Its outputs are hard links into the blob store, so this drops the job's
+    references and lets BlobStore.gc collect objects no other job uses.
+    """
+    # Job IDs are generated, but never let one reach outside JOBS_DIR or into .blobs
+    if not job_id or job_id.startswith('.') or os.path.basename(job_id) != job_id:
+        logger.warning(f"Not removing files of job with unexpected ID {job_id!r}")
+        return
+    job_dir = os.path.join(JOBS_DIR, job_id)
+    if os.path.isdir(job_dir):
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+def delete_job(job_id: str) -> None:
+    """Delete a job from the job store, along with its files."""
+    _store.delete(job_id)
+    _remove_job_files(job_id)
+    logger.info(f"Deleted job {job_id}")
+
+class JobConflictError(Exception):
+    """Raised when a job update loses a version race it cannot retry."""
+
+def _job_lock(job_id: str) -> FileLock:
+    """Get the lock stripe guarding updates to a job."""
+    return _job_locks(job_id)
+
+def update_job(job_id: str, mutate: Callable[[Job], None],
+               expected_version: Optional[int] = None,
+               max_retries: int = JOB_UPDATE_RETRIES) -> Dict[str, Any]:
+    """
+    Apply a change to a job with optimistic concurrency control.
+    
+    The job is read, passed to mutate as a Job to be changed in place (it
+    supports the same job["field"] access as the stored dict), and written
+    back only if its version is still the one that was read. Conflicting
+    writes are retried with a fresh copy of the job. Updates are serialized
+    per job by a striped file lock shared by all processes using DATA_DIR,
+    so conflicts only arise from writers that bypass it.
+    
+    Args:
+        job_id (str): The job ID
+        mutate (callable): Function that modifies the Job in place
+        expected_version (int, optional): Only apply the change if the job is
+            at this version; raises JobConflictError otherwise, without retrying
+        max_retries (int): Maximum number of attempts on conflict
         
-        # Update specific step
-        if "step_name" in kwargs:
-            step_name = kwargs["step_name"]
-            step_found = False
+    Returns:
+        dict: The updated job
+    """
+    with _job_lock(job_id):
+        for attempt in range(max_retries):
+            record = _store.get(job_id)
+            if record is None:
+                raise ValueError(f"Job {job_id} not found")
             
-            for step in job["steps"]:
-                if step["name"] == step_name:
-                    step_found = True
-                    
-                    # Update step fields
-                    for key in ["status", "progress", "message"]:
-                        step_key = f"step_{key}"
-                        if step_key in kwargs:
-                            step[key] = kwargs[step_key]
-                    
-                    break
+            job = Job.from_dict(record)
+            version = job.get("version", 0)
+            if expected_version is not None and version != expected_version:
+                raise JobConflictError(f"Job {job_id} is at version {version}, expected {expected_version}")
             
-            if not step_found:
-                logger.warning(f"Step {step_name} not found in job {job_id}")
-        
-        # Update job timestamp
-        job["updated_at"] = time.time()
-        
-        # Save job
-        with open(job_file, 'w') as f:
-            json.dump(job, f, indent=2)
-        
-        # Update job in jobs list
-        jobs = get_jobs()
-        for j in jobs:
-            if j["job_id"] == job_id:
-                j["status"] = job["status"]
-                j["progress"] = job.get("progress", 0)
-                break
+            mutate(job)
+            job.version = version + 1
+            job.updated_at = time.time()
+            
+            previous, record = record, job.to_dict()
+            if _store.compare_and_swap(record, version):
+                _publish_status(record)
+                # Still under the job lock, so listeners see changes in order
+                _broadcaster.publish(job_id, {"version": job.version, **job_delta(previous, record)})
+                return record
+            
+            if expected_version is not None:
+                raise JobConflictError(f"Job {job_id} was modified concurrently")
+            
+            logger.warning(f"Version conflict updating job {job_id} (attempt {attempt + 1}/{max_retries})")
+            time.sleep(0.01 * (attempt + 1))
+    
+    raise JobConflictError(f"Could not update job {job_id} after {max_retries} attempts")
+
+# A cancelled job keeps its status until it is explicitly resumed
+CANCELLED_STATUSES = {"cancelled", "canceled"}
+
+def update_job_status(job_id: str, status: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+    """
+    Update job status.
+    
+    Updates to a cancelled job are ignored unless they cancel it again, so
+    progress reported by a worker that has not yet noticed the cancellation
+    can't bring the job back to life.
+    """
+    def apply(job):
+        if job.status in CANCELLED_STATUSES and status not in CANCELLED_STATUSES:
+            return
         
-        # Save jobs list
-        with open(JOBS_FILE, 'w') as f:
-            json.dump(jobs, f, indent=2)
+        # Update job status, fields and the named step
+        if not job.apply_update(status, **kwargs):
+            logger.warning(f"Step {kwargs['step_name']} not found in job {job_id}")
+    
+    try:
+        job = update_job(job_id, apply)
         
         logger.info(f"Updated job {job_id} status to {status}")
         return job
@@ -193,36 +381,142 @@ def update_job_status(job_id: str, status: Optional[str] = None, **kwargs) -> Di
 
 def update_job_output(job_id: str, output: Dict[str, Any]) -> Dict[str, Any]:
     """Update job output."""
-    try:
-        # Get job
-        job_file = os.path.join(JOBS_DIR, f"{job_id}.json")
-        if not os.path.exists(job_file):
-            raise ValueError(f"Job {job_id} not found")
-        
-        with open(job_file, 'r') as f:
-            job = json.load(f)
-        
+    def apply(job):
         # Update job output
         if "output" not in job:
             job["output"] = {}
         
+        # Nested dicts such as artifacts are merged rather than replaced
         for key, value in output.items():
-            job["output"][key] = value
-        
-        # Update job timestamp
-        job["updated_at"] = time.time()
+            if isinstance(value, dict) and isinstance(job["output"].get(key), dict):
+                job["output"][key].update(value)
+            else:
+                job["output"][key] = value
         
         # If video is added, mark as ready
         if "video" in output:
             job["video_ready"] = True
             job["video_path"] = output["video"]
-        
-        # Save job
-        with open(job_file, 'w') as f:
-            json.dump(job, f, indent=2)
+    
+    try:
+        job = update_job(job_id, apply)
         
         logger.info(f"Updated job {job_id} output")
         return job
     except Exception as e:
         logger.error(f"Error updating job output: {e}")
         raise
+
+def recover_jobs(max_attempts: int = MAX_RECOVERY_ATTEMPTS,
+                 skip: Optional[Callable[[str], bool]] = None) -> Dict[str, List[str]]:
+    """
+    Reset jobs left in flight by a previous process so they can be re-run.
+    
+    Jobs still pending, initializing or processing are found through the
+    store's status index, so only in-flight jobs are read. Each one is put
+    back to pending for re-running, unless it has already been recovered
+    max_attempts times, in which case it is failed so a job that keeps
+    killing the server can't loop forever.
+    
+    Args:
+        max_attempts (int): Maximum number of times a job is resumed
+        skip (callable, optional): Leave jobs for which skip(job_id) is true
+            untouched, e.g. ones a live worker still holds
+        
+    Returns:
+        dict: {"resumed": [job IDs], "failed": [job IDs]}
+    """
+    started = time.time()
+    resumed, failed = [], []
+    after = None
+    
+    while True:
+        jobs = _store.page(RECOVERY_BATCH_SIZE, after, statuses=sorted(ACTIVE_STATUSES), full=True)
+        if not jobs:
+            break
+        after = (jobs[-1].get("created_at") or 0, jobs[-1]["job_id"])
+        
+        for job in jobs:
+            job_id = job["job_id"]
+            if skip is not None and skip(job_id):
+                continue
+            attempts = job.get("recovery_attempts", 0)
+            
+            if attempts >= max_attempts:
+                update_job_status(job_id, "error",
+                                  error="Job was interrupted by a server restart too many times",
+                                  current_step="Interrupted by server restart")
+                failed.append(job_id)
+                continue
+            
+            def reset(job, attempts=attempts):
+                job["status"] = "pending"
+                job["current_step"] = "Re-queued after server restart"
+                job["recovery_attempts"] = attempts + 1
+            
+            update_job(job_id, reset)
+            resumed.append(job_id)
+    
+    logger.info(f"Recovered in-flight jobs in {time.time() - started:.2f}s: "
+                f"{len(resumed)} resumed, {len(failed)} failed")
+    return {
+        "resumed": resumed,
+        "failed": failed
+    }
+
+def archive_jobs(older_than_days: float = ARCHIVE_AFTER_DAYS) -> int:
+    """
+    Move finished jobs created more than older_than_days ago to the archive.
+    
+    Archived jobs are removed from the job store (and their legacy
+    data/jobs/<id>.json file, if any) but remain readable through get_job.
+    
+    Args:
+        older_than_days (float): Minimum age in days
+        
+    Returns:
+        int: Number of jobs archived
+    """
+    cutoff = time.time() - older_than_days * 86400
+    archived = 0
+    
+    while True:
+        jobs = _store.page(ARCHIVE_BATCH_SIZE, statuses=sorted(TERMINAL_STATUSES),
+                           created_before=cutoff, full=True)
+        if not jobs:
+            break
+        
+        # Write to the archive before removing anything from the hot store
+        _archiver.archive(jobs)
+        for job in jobs:
+            _store.delete(job["job_id"])
+            legacy_file = os.path.join(JOBS_DIR, f"{job['job_id']}.json")
+            if os.path.exists(legacy_file):
+                os.remove(legacy_file)
+        
+        archived += len(jobs)
+    
+    if archived:
+        logger.info(f"Archived {archived} jobs older than {older_than_days} days")
+    return archived
+
+def _archive_loop() -> None:
+    while True:
+        try:
+            if claim_maintenance():
+                archive_jobs()
+                _blob_store.gc()
+        except Exception as e:
+            logger.error(f"Error archiving jobs: {e}")
+        time.sleep(ARCHIVE_INTERVAL)
+
+def start_archival() -> None:
+    """
+    Start archiving finished jobs in the background, unless ARCHIVE_AFTER_DAYS is 0.
+    
+    Called by the processes that serve requests or run jobs, not on import,
+    so a process that never does either (such as the debug reloader's
+    parent) doesn't take the maintenance lock.
+    """
+    if ARCHIVE_AFTER_DAYS > 0:
+        threading.Thread(target=_archive_loop, daemon=True).start()
@@ -0,0 +1,209 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Iterator, Optional
+
+from modules.cancellation import CancellationToken, JobCancelled
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds one run of a job may take, from the moment a worker picks it up
+# (0 disables the limit)
+JOB_DEADLINE_SECONDS = float(os.environ.get('JOB_DEADLINE_SECONDS', 3600))
+
+# Seconds each run of a stage may take (0 disables the limit): the script,
+# one scene's image, one scene's clip, and assembling the final video
+STAGE_DEADLINES = {
+    "script": float(os.environ.get('SCRIPT_DEADLINE_SECONDS', 300)),
+    "image": float(os.environ.get('IMAGE_DEADLINE_SECONDS', 300)),
+    "clip": float(os.environ.get('CLIP_DEADLINE_SECONDS', 900)),
+    "video": float(os.environ.get('VIDEO_DEADLINE_SECONDS', 1800)),
+}
+
+class DeadlineExceeded(JobCancelled):
+    """
+    Raised inside a job's pipeline once the job or one of its stages has
+    run out of time.
+
+    It is a JobCancelled, so it passes through every stage the way a
+    cancellation does, but the job is failed rather than cancelled.
+    """
+
+    def __init__(self, job_id: str, stage: str, budget: float, elapsed: float, scope: str = "stage"):
+        self.job_id = job_id
+        self.stage = stage
+        self.budget = budget
+        self.elapsed = elapsed
+        self.scope = scope
+        if scope == "job":
+            message = f"Job {job_id} exceeded its {budget:g}s deadline during {stage}"
+        else:
+            message = f"Stage {stage} of job {job_id} exceeded its {budget:g}s deadline"
+        super().__init__(message)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Describe the overrun for the job's deadline_exceeded field."""
+        return {
+            "scope": self.scope,
+            "stage": self.stage,
+            "budget": self.budget,
+            "elapsed": round(self.elapsed, 1)
+        }
+
+class Deadline:
+    """
+    Time budget of one run of a job and of each of its stages.
+
+    When the job's budget or a running stage's budget runs out, the job's
+    cancellation token is cancelled with DeadlineExceeded, which aborts the
+    job's HTTP requests and kills its Blender and ffmpeg processes the same
+    way a cancellation does. Code running a stage also caps its own HTTP
+    timeouts and subprocess waits with timeout(), so nothing waits past the
+    budget even before the token is cancelled.
+    """
+
+    def __init__(self, token: CancellationToken, budget: float = JOB_DEADLINE_SECONDS,
+                 stage_budgets: Optional[Dict[str, float]] = None):
+        """
+        Start the job's clock.
+
+        Args:
+            token (CancellationToken): Token of the job
+            budget (float): Seconds the job may take; 0 for no limit
+            stage_budgets (dict, optional): Seconds per stage name; defaults
+                to STAGE_DEADLINES
+        """
+        self.token = token
+        self.budget = budget
+        self.stage_budgets = STAGE_DEADLINES if stage_budgets is None else stage_budgets
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget if budget else None
+        self.exceeded: Optional[DeadlineExceeded] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active: Dict[int, str] = {}
+        self._next_handle = 0
+        self._timers = set()
+        if budget:
+            self._arm(budget, self._expire_job)
+
+    def _arm(self, seconds: float, callback: Callable[..., None], *args) -> threading.Timer:
+        timer = threading.Timer(seconds, callback, args)
+        timer.daemon = True
+        with self._lock:
+            self._timers.add(timer)
+        timer.start()
+        return timer
+
+    def _disarm(self, timer: threading.Timer) -> None:
+        timer.cancel()
+        with self._lock:
+            self._timers.discard(timer)
+
+    def _expire(self, error: DeadlineExceeded) -> None:
+        """Record the first overrun and cancel the job with it."""
+        with self._lock:
+            if self.exceeded is not None:
+                return
+            self.exceeded = error
+        logger.warning(str(error))
+        self.token.cancel(error)
+
+    def _expire_job(self) -> None:
+        with self._lock:
+            running = ", ".join(sorted(set(self._active.values()))) or "pipeline"
+        self._expire(DeadlineExceeded(self.token.job_id, running, self.budget,
+                                      time.monotonic() - self.started_at, scope="job"))
+
+    def _expire_stage(self, name: str, budget: float, started_at: float) -> None:
+        self._expire(DeadlineExceeded(self.token.job_id, name, budget, time.monotonic() - started_at))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Run a block as a stage with its own budget.
+
+        The stage's budget applies to the calling thread: timeout() and
+        raise_if_expired() called from the block take it into account.
+        """
+        budget = self.stage_budgets.get(name) or None
+        started_at = time.monotonic()
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._active[handle] = name
+        timer = self._arm(budget, self._expire_stage, name, budget, started_at) if budget else None
+        previous = getattr(self._local, "stage", None)
+        self._local.stage = (name, budget, started_at)
+        try:
+            yield
+        finally:
+            self._local.stage = previous
+            if timer is not None:
+                self._disarm(timer)
+            with self._lock:
+                del self._active[handle]
+
+    def run(self, name: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call fn as a stage; see stage()."""
+        with self.stage(name):
+            return fn(*args, **kwargs)
+
+    def remaining(self) -> Optional[float]:
+        """Get the seconds left to the job's or the current stage's deadline, or None if neither has one."""
+        now = time.monotonic()
+        limits = []
+        if self.expires_at is not None:
+            limits.append(self.expires_at - now)
+        stage = getattr(self._local, "stage", None)
+        if stage is not None and stage[1]:
+            limits.append(stage[2] + stage[1] - now)
+        return min(limits) if limits else None
+
+    def raise_if_expired(self) -> None:
+        """
+        Raise DeadlineExceeded if the job's or the current stage's deadline
+        has passed, even if its timer has not fired yet.
+        """
+        now = time.monotonic()
+        stage = getattr(self._local, "stage", None)
+        if stage is not None and stage[1] and now >= stage[2] + stage[1]:
+            self._expire_stage(*stage)
+        elif self.expires_at is not None and now >= self.expires_at:
+            self._expire_job()
+        if self.exceeded is not None:
+            raise self.exceeded
+
+    def timeout(self, default: Optional[float] = None) -> Optional[float]:
+        """
+        Cap a timeout at the time left to the deadline.
+
+        Args:
+            default (float, optional): The timeout without a deadline
+
+        Returns:
+            float: The smaller of default and the time left, or default if
+                there is no deadline
+
+        Raises:
+            DeadlineExceeded: If there is no time left
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if remaining <= 0:
+            self.raise_if_expired()
+        remaining = max(remaining, 0.001)
+        return remaining if default is None else min(default, remaining)
+
+    def stop(self) -> None:
+        """Stop the clocks once the job's run is over."""
+        with self._lock:
+            timers = list(self._timers)
+            self._timers.clear()
+        for timer in timers:
+            timer.cancel()
@@ -0,0 +1,64 @@
+import logging
+import threading
+from typing import Dict, Any, Callable, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class StatusBroadcaster:
+    """
+    Pushes job status changes to in-process listeners.
+
+    Listeners are called as listener(job_id, delta) after a change has been
+    committed, in the thread that made the change, so they should hand work
+    off (e.g. to a queue) rather than block. A listener that raises is logged
+    and skipped; it does not affect the update or other listeners.
+    """
+
+    def __init__(self):
+        self._listeners: Dict[int, tuple] = {}
+        self._next_token = 1
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener: Callable[[str, Dict[str, Any]], None],
+                  job_id: Optional[str] = None) -> int:
+        """
+        Register a listener.
+
+        Args:
+            listener (callable): Called with (job_id, delta) on every change
+            job_id (str, optional): Only notify about this job
+
+        Returns:
+            int: Token to pass to unsubscribe
+        """
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._listeners[token] = (job_id, listener)
+        return token
+
+    def unsubscribe(self, token: int) -> bool:
+        """
+        Remove a listener.
+
+        Returns:
+            bool: True if the token was registered
+        """
+        with self._lock:
+            return self._listeners.pop(token, None) is not None
+
+    def publish(self, job_id: str, delta: Dict[str, Any]) -> None:
+        """Notify listeners about a committed change to a job."""
+        with self._lock:
+            listeners = [
+                listener for subscribed_id, listener in self._listeners.values()
+                if subscribed_id is None or subscribed_id == job_id
+            ]
+
+        for listener in listeners:
+            try:
+                listener(job_id, delta)
+            except Exception as e:
+                logger.error(f"Error in status listener for job {job_id}: {e}")
@@ -0,0 +1,112 @@
+import os
+import zlib
+import logging
+import threading
+from typing import List
+
+# fcntl is POSIX-only; without it locks only exclude threads of this process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if fcntl is None:
+    logger.warning("fcntl not available; file locks will not coordinate between processes")
+
+class FileLock:
+    """
+    Exclusive advisory lock on a file, shared by threads and processes.
+
+    A thread lock serializes the threads of this process and an fcntl.flock
+    on the lock file excludes other processes. The lock file is opened on
+    first use and kept open; a forked child opens its own descriptor, since
+    flock locks held through an inherited descriptor are shared with the
+    parent.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the lock.
+
+        Args:
+            path (str): Path of the lock file; created if missing
+        """
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Acquire the lock.
+
+        Args:
+            blocking (bool): Wait for the lock instead of failing immediately
+
+        Returns:
+            bool: True if the lock was acquired
+        """
+        if not self._thread_lock.acquire(blocking):
+            return False
+
+        if fcntl is None:
+            return True
+
+        try:
+            if self._fd is None or self._pid != os.getpid():
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            fcntl.flock(self._fd, flags)
+            return True
+        except BlockingIOError:
+            self._thread_lock.release()
+            return False
+        except Exception:
+            self._thread_lock.release()
+            raise
+
+    def release(self) -> None:
+        """Release the lock."""
+        try:
+            if fcntl is not None and self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+
+
+class StripedFileLock:
+    """
+    A fixed set of FileLocks in a directory, selected by key.
+
+    Keys are mapped to stripes with a stable hash, so every process picks
+    the same lock file for the same job.
+    """
+
+    def __init__(self, lock_dir: str, stripes: int = 64):
+        """
+        Initialize the striped lock.
+
+        Args:
+            lock_dir (str): Directory for the lock files
+            stripes (int): Number of lock files
+        """
+        os.makedirs(lock_dir, exist_ok=True)
+        self._locks: List[FileLock] = [
+            FileLock(os.path.join(lock_dir, f"stripe-{i:03d}.lock")) for i in range(stripes)
+        ]
+
+    def __call__(self, key: str) -> FileLock:
+        """Get the lock guarding a key."""
+        return self._locks[zlib.crc32(key.encode()) % len(self._locks)]
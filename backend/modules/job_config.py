@@ -0,0 +1,70 @@
+import os
+import re
+import json
+import hashlib
+import logging
+from typing import Dict, Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Language model that writes the script
+SCRIPT_MODEL = os.environ.get('HUGGINGFACE_MODEL', 'mistralai/Mistral-7B-Instruct-v0.2')
+
+# Stability AI engine and request parameters for scene images
+IMAGE_MODEL = os.environ.get('STABILITY_MODEL', 'stable-diffusion-xl-1024-v1-0')
+IMAGE_PARAMS = {
+    "cfg_scale": 7,
+    "height": 1024,
+    "width": 1024,
+    "samples": 1,
+    "steps": 30
+}
+
+# The Blender script defines the render settings (resolution, fps, layout)
+BLENDER_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'blender_scripts', 'generate_animation.py')
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so trivially different spellings of it compare equal."""
+    return re.sub(r"\s+", " ", prompt).strip().lower()
+
+def render_profile() -> str:
+    """Get a digest of the render settings, i.e. of the Blender script."""
+    try:
+        with open(BLENDER_SCRIPT_PATH, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        # BlenderAnimator writes its built-in script on first use
+        return "builtin"
+
+def generation_params() -> Dict[str, Any]:
+    """Get the models and parameters that, with the prompt, determine a job's result."""
+    return {
+        "script_model": SCRIPT_MODEL,
+        "image_model": IMAGE_MODEL,
+        "image_params": IMAGE_PARAMS,
+        "render_profile": render_profile()
+    }
+
+def config_key(prompt: str, image_id: Optional[str] = None, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Hash everything that determines a job's result.
+
+    Jobs with the same key produce the same script, images and video, so one
+    can stand in for another.
+
+    Args:
+        prompt (str): The job's prompt
+        image_id (str, optional): The uploaded image the job uses
+        params (dict, optional): Generation parameters; defaults to generation_params()
+
+    Returns:
+        str: Hex SHA-256 of the configuration
+    """
+    config = {
+        "prompt": normalize_prompt(prompt),
+        "image_id": image_id,
+        "params": generation_params() if params is None else params
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
@@ -1,39 +1,318 @@
 import os
+import copy
 import json
+import bisect
 import logging
 import time
 import uuid
 from typing import Dict, List, Any, Optional, Callable
 from threading import Lock
 
+from modules.artifacts import ArtifactData
+from modules.blob_store import BlobStore
+from modules.events import StatusBroadcaster
+from modules.models import Job, job_delta
+from modules.file_lock import FileLock, StripedFileLock
+from modules.shared_status import SharedStatusTable
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class JobManager:
-    """Manages video generation jobs and their statuses."""
+    """
+    Manages video generation jobs and their statuses.
+    
+    Several processes may share a storage directory: job writes are
+    serialized by file locks under .locks/, every write bumps the job's
+    version in a shared memory-mapped status table (status.mmap), and each
+    process reuses its in-memory copy of a job only while that version is
+    unchanged.
+    """
     
-    def __init__(self, storage_dir: str = "jobs"):
+    # Number of per-job lock stripes guarding record writes
+    LOCK_STRIPES = 64
+    
+    def __init__(self, storage_dir: str = "jobs", layout: str = "record"):
         """
         Initialize the JobManager.
         
         Args:
             storage_dir (str): Directory to store job data
+            layout (str): "record" keeps each job's data and status in one
+                file under records/; "split" keeps them in jobs/ and status/.
+                Jobs found in the split layout are migrated to the record
+                layout on startup.
         """
+        if layout not in ("record", "split"):
+            raise ValueError(f"Unknown storage layout: {layout}")
+        
         self.storage_dir = storage_dir
+        self.layout = layout
         self.jobs_dir = os.path.join(storage_dir, "jobs")
         self.status_dir = os.path.join(storage_dir, "status")
+        self.records_dir = os.path.join(storage_dir, "records")
         self.output_dir = os.path.join(storage_dir, "output")
         
         # Create directories if they don't exist
-        for directory in [self.jobs_dir, self.status_dir, self.output_dir]:
+        if layout == "record":
+            directories = [self.records_dir, self.output_dir]
+        else:
+            directories = [self.jobs_dir, self.status_dir, self.output_dir]
+        for directory in directories:
             os.makedirs(directory, exist_ok=True)
         
-        # Lock for thread safety
+        # Content-addressed storage that output files are hard-linked to
+        self.blobs = BlobStore(os.path.join(self.output_dir, ".blobs"))
+        
+        # Lock for thread safety; guards the in-memory index
         self.lock = Lock()
         
+        # Per-job locks, striped so updates to different jobs rarely contend;
+        # file locks so other processes are excluded too
+        self._job_locks = StripedFileLock(os.path.join(storage_dir, ".locks"), self.LOCK_STRIPES)
+        
+        # Status, progress and version of every job, shared by all processes
+        self._status_table = SharedStatusTable(os.path.join(storage_dir, "status.mmap"))
+        
+        # (version, data, status) of every job this manager has read or written,
+        # so status readers don't go to disk while the job is unchanged
+        self._records: Dict[str, tuple] = {}
+        
+        # Listeners notified when a job's status changes
+        self._broadcaster = StatusBroadcaster()
+        
+        if layout == "record":
+            self._migrate_split_layout()
+        
+        # Jobs ordered by creation time, with their latest status and progress
+        self.index_path = os.path.join(storage_dir, "index.jsonl")
+        self._index_lock = FileLock(os.path.join(storage_dir, ".locks", "index.lock"))
+        self._order: List[tuple] = []
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._index_file = None
+        # Inode and read position of the index log, to pick up other processes' appends
+        self._index_inode = None
+        self._index_offset = 0
+        self._load_index()
+        
         logger.info(f"JobManager initialized with storage directory: {storage_dir}")
     
+    def _job_lock(self, job_id: str) -> FileLock:
+        """Get the lock guarding a job's stored record."""
+        return self._job_locks(job_id)
+    
+    def _job_ids(self) -> List[str]:
+        """List the IDs of all stored jobs."""
+        directory = self.records_dir if self.layout == "record" else self.jobs_dir
+        return [f[:-len('.json')] for f in os.listdir(directory) if f.endswith('.json')]
+    
+    def _read_record(self, job_id: str) -> tuple:
+        """
+        Read a job's data and status, from memory when the job has been seen
+        and no process has changed it since.
+        
+        Returns:
+            tuple: (job data, job status), copies the caller may modify
+        """
+        # Read the version before the file, so a concurrent write leaves the
+        # cached copy looking stale rather than current
+        version = self._status_table.version(job_id)
+        cached = self._records.get(job_id)
+        if cached is not None and cached[0] == version:
+            return copy.deepcopy(cached[1:])
+        
+        if self.layout == "record":
+            record_path = os.path.join(self.records_dir, f"{job_id}.json")
+            if not os.path.exists(record_path):
+                raise ValueError(f"Job {job_id} not found")
+            
+            with open(record_path, 'r') as f:
+                data = json.load(f)
+            record = (data["job"], data["status"])
+        else:
+            job_path = os.path.join(self.jobs_dir, f"{job_id}.json")
+            status_path = os.path.join(self.status_dir, f"{job_id}.json")
+            
+            if not os.path.exists(job_path):
+                raise ValueError(f"Job {job_id} not found")
+            if not os.path.exists(status_path):
+                raise ValueError(f"Status for job {job_id} not found")
+            
+            with open(job_path, 'r') as f:
+                job_data = json.load(f)
+            with open(status_path, 'r') as f:
+                record = (job_data, json.load(f))
+        
+        self._records[job_id] = (version,) + record
+        return copy.deepcopy(record)
+    
+    def _write_record(self, job_id: str, job_data: Dict[str, Any], status: Dict[str, Any]) -> None:
+        """Write a job's data and status. Caller holds the job lock."""
+        version = self._status_table.version(job_id) + 1
+        
+        if self.layout == "record":
+            # Write to a temp file and rename so a crash never leaves a torn record
+            record_path = os.path.join(self.records_dir, f"{job_id}.json")
+            tmp_path = f"{record_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({"job": job_data, "status": status}, f)
+            os.replace(tmp_path, record_path)
+        else:
+            with open(os.path.join(self.jobs_dir, f"{job_id}.json"), 'w') as f:
+                json.dump(job_data, f)
+            with open(os.path.join(self.status_dir, f"{job_id}.json"), 'w') as f:
+                json.dump(status, f)
+        
+        # Publish the new version only once the write is on disk
+        if not self._status_table.put(job_id, status.get("status"), status.get("progress", 0),
+                                      version, job_data.get("updated_at")):
+            # Not tracked, so the cached copy can't be validated; always re-read
+            version = -1
+        self._records[job_id] = (version,) + copy.deepcopy((job_data, status))
+    
+    def _migrate_split_layout(self) -> None:
+        """Move jobs stored in jobs/ and status/ into single records."""
+        if not os.path.isdir(self.jobs_dir):
+            return
+        
+        migrated = 0
+        for job_file in os.listdir(self.jobs_dir):
+            if not job_file.endswith('.json'):
+                continue
+            
+            job_path = os.path.join(self.jobs_dir, job_file)
+            status_path = os.path.join(self.status_dir, job_file)
+            try:
+                with open(job_path, 'r') as f:
+                    job_data = json.load(f)
+                with open(status_path, 'r') as f:
+                    status = json.load(f)
+                
+                self._write_record(job_data["job_id"], job_data, status)
+                os.remove(job_path)
+                os.remove(status_path)
+                migrated += 1
+            except Exception as e:
+                logger.error(f"Error migrating job file {job_file}: {e}")
+        
+        # Remove the old directories once they are empty
+        for directory in [self.jobs_dir, self.status_dir]:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+        
+        if migrated:
+            logger.info(f"Migrated {migrated} jobs to the single-record layout")
+    
+    def _load_index(self) -> None:
+        """
+        Load the job index, rebuilding it from the job files if needed.
+        
+        The index is an append-only log: one line when a job is created and
+        one whenever its status or progress changes, so keeping it current
+        costs a single appended line. It is rewritten compactly on load when
+        the log has grown well past the number of jobs.
+        """
+        with self._index_lock:
+            lines = 0
+            if os.path.exists(self.index_path):
+                lines = self._read_index()
+            else:
+                for job_id in self._job_ids():
+                    try:
+                        job_data, status_data = self._read_record(job_id)
+                        self._apply_index_entry({
+                            "job_id": job_data["job_id"],
+                            "created_at": job_data.get("created_at", 0),
+                            "status": status_data["status"],
+                            "progress": status_data["progress"]
+                        })
+                    except Exception as e:
+                        logger.error(f"Error indexing job {job_id}: {e}")
+            
+            if lines == 0 or lines > 2 * len(self._index):
+                tmp_path = f"{self.index_path}.tmp"
+                with open(tmp_path, 'w') as f:
+                    for _, job_id in self._order:
+                        f.write(json.dumps(self._index[job_id]) + "\n")
+                os.replace(tmp_path, self.index_path)
+            
+            self._open_index()
+            self._index_offset = os.path.getsize(self.index_path)
+    
+    def _open_index(self) -> None:
+        """Open the index log for appending."""
+        if self._index_file is not None:
+            self._index_file.close()
+        self._index_file = open(self.index_path, 'a')
+        self._index_inode = os.fstat(self._index_file.fileno()).st_ino
+    
+    def _apply_index_entry(self, entry: Dict[str, Any]) -> bool:
+        """
+        Merge an index line into the in-memory index.
+        
+        Returns:
+            bool: True if the entry changed the index
+        """
+        current = self._index.get(entry["job_id"])
+        if current is None:
+            self._index[entry["job_id"]] = dict(entry)
+            bisect.insort(self._order, (entry["created_at"], entry["job_id"]))
+            return True
+        if all(current.get(key) == value for key, value in entry.items()):
+            return False
+        current.update(entry)
+        return True
+    
+    def _read_index(self) -> int:
+        """
+        Apply index lines written since the last read, including those
+        appended by other processes.
+        
+        Returns:
+            int: Number of lines read
+        """
+        lines = 0
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._apply_index_entry(json.loads(line))
+                self._index_offset += len(line)
+                lines += 1
+        return lines
+    
+    def _refresh_index(self) -> None:
+        """Catch up with the index log. Caller holds the lock."""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return
+        
+        if stat.st_ino != self._index_inode:
+            # Another process compacted the log; read the new one from the start
+            self._index = {}
+            self._order = []
+            self._index_offset = 0
+            self._open_index()
+        elif stat.st_size <= self._index_offset:
+            return
+        
+        self._read_index()
+    
+    def _index_job(self, job_id: str, **fields) -> None:
+        """Record a new or changed job in the index. Caller holds the lock."""
+        with self._index_lock:
+            self._refresh_index()
+            if not self._apply_index_entry({"job_id": job_id, **fields}):
+                return
+            
+            self._index_file.write(json.dumps({"job_id": job_id, **fields}) + "\n")
+            self._index_file.flush()
+    
     def create_job(self, prompt: str, image_id: Optional[str] = None) -> str:
         """
         Create a new job.
@@ -90,14 +369,15 @@ class JobManager:
             "output": {}
         }
         
-        with self.lock:
-            # Save job data
-            with open(os.path.join(self.jobs_dir, f"{job_id}.json"), 'w') as f:
-                json.dump(job_data, f)
+        with self._job_lock(job_id):
+            # Save job data and initial status
+            self._write_record(job_id, job_data, initial_status)
             
-            # Save initial status
-            with open(os.path.join(self.status_dir, f"{job_id}.json"), 'w') as f:
-                json.dump(initial_status, f)
+            with self.lock:
+                self._index_job(job_id,
+                                created_at=job_data["created_at"],
+                                status=initial_status["status"],
+                                progress=initial_status["progress"])
         
         logger.info(f"Created job {job_id} with prompt: {prompt}")
         return job_id
@@ -112,13 +392,7 @@ class JobManager:
         Returns:
             dict: The job data
         """
-        job_path = os.path.join(self.jobs_dir, f"{job_id}.json")
-        
-        if not os.path.exists(job_path):
-            raise ValueError(f"Job {job_id} not found")
-        
-        with open(job_path, 'r') as f:
-            return json.load(f)
+        return self._read_record(job_id)[0]
     
     def get_job_status(self, job_id: str) -> Dict[str, Any]:
         """
@@ -130,13 +404,7 @@ class JobManager:
         Returns:
             dict: The job status
         """
-        status_path = os.path.join(self.status_dir, f"{job_id}.json")
-        
-        if not os.path.exists(status_path):
-            raise ValueError(f"Status for job {job_id} not found")
-        
-        with open(status_path, 'r') as f:
-            return json.load(f)
+        return self._read_record(job_id)[1]
     
     def list_jobs(self, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
         """
@@ -149,30 +417,26 @@ class JobManager:
         Returns:
             list: List of job data
         """
-        job_files = [f for f in os.listdir(self.jobs_dir) if f.endswith('.json')]
-        
-        # Sort by creation time (newest first)
-        job_files.sort(key=lambda f: os.path.getmtime(os.path.join(self.jobs_dir, f)), reverse=True)
-        
-        # Apply pagination
-        job_files = job_files[offset:offset + limit]
+        with self.lock:
+            self._refresh_index()
+            
+            # Walk the creation-time index from the newest end
+            end = len(self._order) - offset
+            start = max(end - limit, 0)
+            entries = [dict(self._index[job_id]) for _, job_id in reversed(self._order[start:max(end, 0)])]
         
         jobs = []
-        for job_file in job_files:
-            with open(os.path.join(self.jobs_dir, job_file), 'r') as f:
-                job_data = json.load(f)
-                
-                # Add status summary
-                try:
-                    status_data = self.get_job_status(job_data["job_id"])
-                    job_data["status"] = status_data["status"]
-                    job_data["progress"] = status_data["progress"]
-                except Exception as e:
-                    logger.error(f"Error getting status for job {job_data['job_id']}: {e}")
-                    job_data["status"] = "error"
-                    job_data["progress"] = 0
-                
-                jobs.append(job_data)
+        for entry in entries:
+            try:
+                job_data = self.get_job(entry["job_id"])
+            except Exception as e:
+                logger.error(f"Error reading job {entry['job_id']}: {e}")
+                continue
+            
+            # Add status summary from the index
+            job_data["status"] = entry["status"]
+            job_data["progress"] = entry["progress"]
+            jobs.append(job_data)
         
         return jobs
     
@@ -187,67 +451,72 @@ class JobManager:
         Returns:
             dict: The updated job status
         """
-        status_path = os.path.join(self.status_dir, f"{job_id}.json")
-        
-        if not os.path.exists(status_path):
-            raise ValueError(f"Status for job {job_id} not found")
-        
-        with self.lock:
-            # Read current status
-            with open(status_path, 'r') as f:
-                status = json.load(f)
+        with self._job_lock(job_id):
+            # Read current data and status
+            job_data, previous = self._read_record(job_id)
+            status = Job.from_dict(previous)
             
-            # Update overall status fields
-            for key in ["status", "progress", "current_step", "error"]:
-                if key in kwargs:
-                    status[key] = kwargs[key]
-            
-            # Update specific step
-            if "step_name" in kwargs:
-                step_name = kwargs["step_name"]
-                step_found = False
-                
-                for step in status["steps"]:
-                    if step["name"] == step_name:
-                        step_found = True
-                        
-                        # Update step fields
-                        for key in ["status", "progress", "message"]:
-                            step_key = f"step_{key}"
-                            if step_key in kwargs:
-                                step[key] = kwargs[step_key]
-                        
-                        break
-                
-                if not step_found:
-                    logger.warning(f"Step {step_name} not found in job {job_id}")
+            # Update overall status fields and the named step
+            if not status.apply_update(**kwargs):
+                logger.warning(f"Step {kwargs['step_name']} not found in job {job_id}")
             
-            # Update output
+            # Update output; nested dicts such as artifacts are merged rather than replaced
             if "output" in kwargs:
-                if "output" not in status:
-                    status["output"] = {}
-                
+                output = status.setdefault("output", {})
                 for key, value in kwargs["output"].items():
-                    status["output"][key] = value
+                    if isinstance(value, dict) and isinstance(output.get(key), dict):
+                        output[key].update(value)
+                    else:
+                        output[key] = value
             
-            # Save updated status
-            with open(status_path, 'w') as f:
-                json.dump(status, f)
+            status = status.to_dict()
             
             # Update job data
-            job_path = os.path.join(self.jobs_dir, f"{job_id}.json")
-            with open(job_path, 'r') as f:
-                job_data = json.load(f)
-            
             job_data["updated_at"] = time.time()
             job_data["status"] = status["status"]
             
-            with open(job_path, 'w') as f:
-                json.dump(job_data, f)
+            # Save updated data and status
+            self._write_record(job_id, job_data, status)
+            
+            with self.lock:
+                self._index_job(job_id, status=status["status"], progress=status["progress"])
+            
+            # Notify while still holding the job lock so listeners see changes in order
+            delta = job_delta(previous, status)
+            if delta:
+                self._broadcaster.publish(job_id, delta)
         
         logger.info(f"Updated status for job {job_id}: {kwargs}")
         return status
     
+    def subscribe(self, listener: Callable[[str, Dict[str, Any]], None],
+                  job_id: Optional[str] = None) -> int:
+        """
+        Register a listener for status changes.
+        
+        Args:
+            listener (callable): Called as listener(job_id, delta) after each
+                committed status update, where delta holds the changed fields
+                (see models.job_delta)
+            job_id (str, optional): Only notify about this job
+            
+        Returns:
+            int: Token to pass to unsubscribe
+        """
+        return self._broadcaster.subscribe(listener, job_id)
+    
+    def unsubscribe(self, token: int) -> bool:
+        """
+        Remove a status listener.
+        
+        Args:
+            token (int): Token returned by subscribe
+            
+        Returns:
+            bool: True if the listener was registered
+        """
+        return self._broadcaster.unsubscribe(token)
+    
     def get_status_update_callback(self, job_id: str) -> Callable:
         """
         Get a callback function for updating job status.
@@ -274,45 +543,44 @@ class JobManager:
         Returns:
             str: Path to the saved script file
         """
-        script_dir = os.path.join(self.output_dir, job_id)
-        os.makedirs(script_dir, exist_ok=True)
-        
-        script_path = os.path.join(script_dir, "script.json")
-        
-        with open(script_path, 'w') as f:
-            json.dump(script, f, indent=2)
+        script_path = os.path.join(self.output_dir, job_id, "script.json")
+        artifact = self.blobs.put(json.dumps(script, indent=2).encode(), script_path)
         
         # Update job status with script output
         self.update_job_status(
             job_id,
-            output={"script": script_path}
+            output={
+                "script": script_path,
+                "artifacts": {
+                    script_path: {
+                        "size": artifact["size"],
+                        "sha256": artifact["sha256"]
+                    }
+                }
+            }
         )
         
         return script_path
     
-    def save_image(self, job_id: str, image_data: bytes, image_index: int) -> str:
+    def save_image(self, job_id: str, image_data: ArtifactData, image_index: int) -> str:
         """
         Save a generated image.
         
         Args:
             job_id (str): The job ID
-            image_data (bytes): The image data
+            image_data: The image data, as bytes, a binary file-like object
+                or an iterable of bytes chunks; streamed to disk in chunks
             image_index (int): The image index
             
         Returns:
             str: Path to the saved image file
         """
-        images_dir = os.path.join(self.output_dir, job_id, "images")
-        os.makedirs(images_dir, exist_ok=True)
-        
-        image_path = os.path.join(images_dir, f"{image_index}.png")
-        
-        with open(image_path, 'wb') as f:
-            f.write(image_data)
+        image_path = os.path.join(self.output_dir, job_id, "images", f"{image_index}.png")
+        artifact = self.blobs.put(image_data, image_path)
         
         # Update job status with image output
-        with self.lock:
-            status = self.get_job_status(job_id)
+        with self._job_lock(job_id):
+            job_data, status = self._read_record(job_id)
             
             if "output" not in status:
                 status["output"] = {}
@@ -323,30 +591,30 @@ class JobManager:
             if image_path not in status["output"]["images"]:
                 status["output"]["images"].append(image_path)
             
-            status_path = os.path.join(self.status_dir, f"{job_id}.json")
-            with open(status_path, 'w') as f:
-                json.dump(status, f)
+            status["output"].setdefault("artifacts", {})[image_path] = {
+                "size": artifact["size"],
+                "sha256": artifact["sha256"]
+            }
+            
+            self._write_record(job_id, job_data, status)
         
         return image_path
     
-    def save_video(self, job_id: str, video_data: bytes) -> str:
+    def save_video(self, job_id: str, video_data: ArtifactData) -> str:
         """
         Save a generated video.
         
         Args:
             job_id (str): The job ID
-            video_data (bytes): The video data
+            video_data: The video data, as bytes, a binary file-like object
+                (e.g. an open render output) or an iterable of bytes chunks;
+                streamed to disk in chunks
             
         Returns:
             str: Path to the saved video file
         """
-        video_dir = os.path.join(self.output_dir, job_id)
-        os.makedirs(video_dir, exist_ok=True)
-        
-        video_path = os.path.join(video_dir, "output.mp4")
-        
-        with open(video_path, 'wb') as f:
-            f.write(video_data)
+        video_path = os.path.join(self.output_dir, job_id, "output.mp4")
+        artifact = self.blobs.put(video_data, video_path)
         
         # Update job status with video output
         self.update_job_status(
@@ -354,7 +622,15 @@ class JobManager:
             status="completed",
             progress=100,
             current_step="Video generation completed",
-            output={"video": video_path}
+            output={
+                "video": video_path,
+                "artifacts": {
+                    video_path: {
+                        "size": artifact["size"],
+                        "sha256": artifact["sha256"]
+                    }
+                }
+            }
         )
         
         return video_path
@@ -1,37 +1,290 @@
 import os
 import json
+import shutil
+import hashlib
 import logging
 import time
 import traceback
 from pathlib import Path
+from concurrent.futures import as_completed, wait
 
-from modules.database import get_job, update_job_status, update_job_output
+from modules import cancellation
+from modules.cancellation import JobCancelled
+from modules.deadline import Deadline, DeadlineExceeded
+from modules.progress import ProgressReporter
+from modules.database import (get_job, get_job_status, update_job, update_job_output,
+                              get_blob_store, CANCELLED_STATUSES, DATA_DIR, JOBS_DIR)
+from modules.job_config import config_key
+from modules.result_cache import ResultCache
 from modules.script_generator import ScriptGenerator
 from modules.asset_generator import AssetGenerator
 from modules.blender_animator import BlenderAnimator
+from modules.scheduler import get_scheduler, IO, CPU
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Jobs directory
-JOBS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'jobs')
+# Overall job progress at the start and end of the scene stages
+SCENES_PROGRESS_START = 50
+SCENES_PROGRESS_END = 90
+
+# Finished results are reused by later jobs with the same configuration for
+# RESULT_CACHE_TTL seconds (default a week), keeping at most
+# RESULT_CACHE_MAX_BYTES of results (default 10 GiB) before evicting the least
+# recently used
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 7 * 24 * 3600))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 10 * 1024 ** 3))
+_result_cache = ResultCache(os.path.join(DATA_DIR, 'results.db'), RESULT_CACHE_TTL, RESULT_CACHE_MAX_BYTES)
+
+def _is_cancelled(job_id):
+    """Check the shared status table for a cancellation made by any process."""
+    status = get_job_status(job_id)
+    return status is not None and status["status"] in CANCELLED_STATUSES
+
+def _artifact_entry(artifact):
+    """Format a stored artifact for the job's output.artifacts map."""
+    return {artifact["path"]: {"size": artifact["size"], "sha256": artifact["sha256"]}}
+
+def _inputs_hash(*inputs):
+    """Hash the inputs of a stage so a checkpoint is only reused for the same inputs."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+def _file_sha256(path):
+    """Hash a file's content, for stages whose inputs are files."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _restore(checkpoints, stage, inputs):
+    """
+    Get the outputs of a stage completed by an earlier run.
+    
+    Returns:
+        dict: The checkpointed outputs, or None if the stage has to run
+            (no checkpoint, different inputs, or an output file is gone)
+    """
+    checkpoint = checkpoints.get(stage)
+    if not checkpoint or checkpoint.get("inputs") != inputs:
+        return None
+    outputs = checkpoint.get("outputs", {})
+    if not all(os.path.exists(path) for path in outputs.values() if path):
+        return None
+    logger.info(f"Reusing checkpointed {stage}")
+    return outputs
+
+def _save_checkpoint(job_id, stage, inputs, outputs, artifacts=None):
+    """
+    Record a completed stage, its inputs hash and its output paths on the job,
+    along with the stage's entries for output.artifacts, if any.
+    """
+    def apply(job):
+        job.setdefault("checkpoints", {})[stage] = {
+            "inputs": inputs,
+            "outputs": outputs,
+            "completed_at": time.time()
+        }
+        if artifacts:
+            job.setdefault("output", {}).setdefault("artifacts", {}).update(artifacts)
+    
+    update_job(job_id, apply)
+
+def _start_scenes(job, count):
+    """Set up per-scene progress tracking on a job."""
+    job["scenes"] = [
+        {"index": index, "status": "pending", "progress": 0, "image": None, "clip": None}
+        for index in range(count)
+    ]
+    job.apply_update("processing",
+                     current_step=f"Generating {count} scenes",
+                     progress=SCENES_PROGRESS_START,
+                     step_name="asset_generation",
+                     step_status="processing",
+                     step_progress=0)
+    job.apply_update(step_name="animation", step_status="processing", step_progress=0)
+
+def _update_scene(job_id, index, **fields):
+    """
+    Update one scene of a job and roll its progress up into the job.
+    
+    A scene is at 50% once its image is generated (or has failed) and at
+    100% once its clip is rendered, so asset_generation tracks images and
+    animation tracks clips.
+    """
+    def apply(job):
+        scenes = job["scenes"]
+        scenes[index].update(fields)
+        
+        count = len(scenes)
+        images = sum(1 for scene in scenes if scene["progress"] >= 50)
+        clips = sum(1 for scene in scenes if scene["progress"] >= 100)
+        done = sum(scene["progress"] for scene in scenes) / (100 * count)
+        
+        job.apply_update(current_step=f"Scenes: {images}/{count} images, {clips}/{count} clips",
+                         progress=round(SCENES_PROGRESS_START + (SCENES_PROGRESS_END - SCENES_PROGRESS_START) * done),
+                         step_name="asset_generation",
+                         step_status="completed" if images == count else "processing",
+                         step_progress=round(100 * images / count))
+        job.apply_update(step_name="animation",
+                         step_status="completed" if clips == count else "processing",
+                         step_progress=round(100 * clips / count))
+    
+    update_job(job_id, apply)
+
+def materialize_outputs(source_job, job_id, current_step):
+    """
+    Complete a job with the outputs of a finished job of the same configuration.
+    
+    Every output file (script, images, clips, video) is hard-linked from the
+    blob store to the same place in the job's own directory, so the job gets
+    its own complete copy without any data being written. Its checkpoints
+    and scenes point at the linked files, as if it had run itself.
+    
+    Args:
+        source_job (dict): The completed job
+        job_id (str): The job to complete
+        current_step (str): Step message recording where the result came from
+        
+    Returns:
+        dict: The updated job
+    """
+    blob_store = get_blob_store()
+    source_dir = os.path.join(JOBS_DIR, source_job["job_id"])
+    job_dir = os.path.join(JOBS_DIR, job_id)
+    source_output = source_job.get("output", {})
+    known = source_output.get("artifacts", {})
+    artifacts = {}
+    linked = {}
+    
+    def link(path):
+        if not path or not os.path.exists(path):
+            return path
+        if path not in linked:
+            dest_path = os.path.join(job_dir, os.path.relpath(path, source_dir))
+            entry = known.get(path)
+            sha256 = entry["sha256"] if entry and entry["sha256"] in blob_store else blob_store.adopt(path)["sha256"]
+            artifacts.update(_artifact_entry(blob_store.link(sha256, dest_path)))
+            linked[path] = dest_path
+        return linked[path]
+    
+    output = dict(source_output)
+    for key in ("script", "video"):
+        if key in output:
+            output[key] = link(output[key])
+    if "assets" in output:
+        output["assets"] = [link(path) for path in output["assets"]]
+    
+    checkpoints = {
+        stage: dict(checkpoint, outputs={name: link(path) for name, path in checkpoint.get("outputs", {}).items()})
+        for stage, checkpoint in source_job.get("checkpoints", {}).items()
+    }
+    scenes = [
+        dict(scene, image=link(scene.get("image")), clip=link(scene.get("clip")))
+        for scene in source_job.get("scenes", [])
+    ]
+    output["artifacts"] = artifacts
+    
+    def apply(job):
+        job["output"] = output
+        job["checkpoints"] = checkpoints
+        job["scenes"] = scenes
+        job["steps"] = source_job.get("steps", [])
+        job["video_ready"] = "video" in output
+        job["video_path"] = output.get("video")
+        job["materialized_from"] = source_job["job_id"]
+        job.apply_update("completed", progress=100, current_step=current_step)
+    
+    logger.info(f"Job {job_id} completed with the result of job {source_job['job_id']}")
+    return update_job(job_id, apply)
+
+def get_result_cache():
+    """Get the cache of finished results by job configuration."""
+    return _result_cache
+
+def complete_from_cache(job_id, key):
+    """
+    Complete a job with a cached result for its configuration, if there is one.
+    
+    Args:
+        job_id (str): The job
+        key (str): The job's configuration key
+        
+    Returns:
+        bool: True if the job was completed from the cache
+    """
+    source_id = _result_cache.get(key)
+    if not source_id or source_id == job_id:
+        return False
+    
+    source = get_job(source_id)
+    video = (source or {}).get("output", {}).get("video")
+    if not source or source.get("status") != "completed" or not video or not os.path.exists(video):
+        logger.info(f"Dropping cached result of job {source_id}: it is no longer available")
+        _result_cache.discard(key)
+        return False
+    
+    materialize_outputs(source, job_id, f"Completed with the cached result of job {source_id}")
+    return True
+
+def _cache_result(job_id, key):
+    """Make a completed job the cached result for its configuration."""
+    job = get_job(job_id)
+    size = sum(entry["size"] for entry in job.get("output", {}).get("artifacts", {}).values())
+    _result_cache.put(key, job_id, size)
 
 def process_job(job_id):
-    """Process a job with the given ID."""
+    """
+    Process a job with the given ID.
+    
+    Each stage (script, and every scene's image and clip) is checkpointed on
+    the job with a hash of its inputs. Running a job again, e.g. after a
+    failure or a restart, skips every stage whose checkpoint still matches
+    and whose output files still exist.
+    
+    Stages run on the process-wide scheduler: script and image generation
+    in its I/O pool, renders and muxing in its CPU pool, so renders of one
+    job keep the cores busy while other jobs wait on remote APIs.
+    
+    A job whose configuration has a cached result is completed with it
+    without running, unless it was submitted with force_regenerate.
+    
+    The job is checked for cancellation between and inside stages;
+    cancelling it also aborts its HTTP requests and kills its Blender and
+    ffmpeg processes, so the worker running it is freed straight away.
+    
+    Status updates go through a ProgressReporter, so progress is written at
+    most once per PROGRESS_UPDATE_INTERVAL while state transitions are
+    written straight away.
+    
+    The run and each of its stages have deadlines (see modules.deadline).
+    A job that runs out of time is aborted the same way and failed, with
+    the stage that overran recorded in its deadline_exceeded field.
+    """
+    token = cancellation.register(job_id)
+    cancellation.watch(_is_cancelled)
+    deadline = Deadline(token)
+    progress = ProgressReporter(job_id)
     try:
         logger.info(f"Starting to process job {job_id}")
         
         # Update job status to initializing
-        update_job_status(job_id, "initializing", 
-                          current_step="Initializing job", 
-                          progress=5)
+        progress("initializing", 
+                 current_step="Initializing job", 
+                 progress=5)
         
         # Get job details
         job = get_job(job_id)
         if not job:
             logger.error(f"Job {job_id} not found")
             return
+        if job["status"] in CANCELLED_STATUSES:
+            raise JobCancelled(f"Job {job_id} was cancelled")
+        
+        key = job.get("config_key") or config_key(job["prompt"], job.get("image_id"))
+        if not job.get("force_regenerate") and complete_from_cache(job_id, key):
+            return
         
         logger.info(f"Processing job with prompt: {job['prompt']}")
         
@@ -39,135 +292,231 @@ def process_job(job_id):
         job_dir = os.path.join(JOBS_DIR, job_id)
         os.makedirs(job_dir, exist_ok=True)
         
-        # Define a callback function to update job status
-        def status_callback(**kwargs):
-            update_job_status(job_id, **kwargs)
+        # Stages completed by earlier runs of this job
+        checkpoints = job.get("checkpoints", {})
+        
+        blob_store = get_blob_store()
+        scheduler = get_scheduler()
         
         # Generate script
         logger.info(f"Generating script for job {job_id}")
-        update_job_status(job_id, "processing", 
-                          current_step="Generating script", 
-                          progress=10,
-                          step_name="script_generation",
-                          step_status="processing",
-                          step_progress=0)
-        
-        script_generator = ScriptGenerator()
-        script_result = script_generator.generate_script(job["prompt"], status_callback)
-        
-        if script_result["status"] != "success":
-            error_msg = script_result.get('error', 'Unknown error during script generation')
-            logger.error(f"Script generation failed: {error_msg}")
-            update_job_status(job_id, "error", 
-                              error=error_msg,
-                              step_name="script_generation",
-                              step_status="error",
-                              step_progress=0)
-            return
+        progress("processing", 
+                 current_step="Generating script", 
+                 progress=10,
+                 step_name="script_generation",
+                 step_status="processing",
+                 step_progress=0)
+        
+        script_inputs = _inputs_hash("script", job["prompt"])
+        restored = _restore(checkpoints, "script", script_inputs)
+        if restored:
+            with open(restored["script"], 'r') as f:
+                script_result = {"status": "success", "script": json.load(f)}
+            progress("processing",
+                     current_step="Script restored from checkpoint",
+                     progress=SCENES_PROGRESS_START,
+                     step_name="script_generation",
+                     step_status="completed",
+                     step_progress=100)
+        else:
+            script_generator = ScriptGenerator(cancel_token=token, deadline=deadline)
+            script_result = scheduler.run(IO, deadline.run, "script",
+                                          script_generator.generate_script, job["prompt"], progress)
+            
+            if script_result["status"] != "success":
+                error_msg = script_result.get('error', 'Unknown error during script generation')
+                logger.error(f"Script generation failed: {error_msg}")
+                progress("error", 
+                         error=error_msg,
+                         step_name="script_generation",
+                         step_status="error",
+                         step_progress=0)
+                return
+            
+            # Save script to job directory, sharing storage with identical scripts
+            script_path = os.path.join(job_dir, "script.json")
+            artifact = blob_store.put(json.dumps(script_result["script"], indent=2).encode(), script_path)
+            
+            # Update job with script output
+            update_job_output(job_id, {"script": script_path, "artifacts": _artifact_entry(artifact)})
+            _save_checkpoint(job_id, "script", script_inputs, {"script": script_path})
+            
+            logger.info(f"Script generated and saved to {script_path}")
         
-        # Save script to job directory
-        script_path = os.path.join(job_dir, "script.json")
-        with open(script_path, 'w') as f:
-            json.dump(script_result["script"], f, indent=2)
-        
-        # Update job with script output
-        update_job_output(job_id, {"script": script_path})
-        
-        logger.info(f"Script generated and saved to {script_path}")
-        
-        # Generate assets
-        logger.info(f"Generating assets for job {job_id}")
-        update_job_status(job_id, "processing", 
-                          current_step="Generating assets", 
-                          progress=30,
-                          step_name="asset_generation",
-                          step_status="processing",
-                          step_progress=0)
-        
-        # Call the AssetGenerator to generate assets
-        asset_generator = AssetGenerator()
-        assets_result = asset_generator.generate_assets(job_dir, script_result["script"], status_callback)
-        
-        if assets_result["status"] != "success":
-            error_msg = assets_result.get('error', 'Unknown error during asset generation')
-            logger.error(f"Asset generation failed: {error_msg}")
-            update_job_status(job_id, "error", 
-                              error=error_msg,
-                              step_name="asset_generation",
-                              step_status="error",
-                              step_progress=0)
+        token.raise_if_cancelled()
+        scenes = script_result["script"].get("scenes", [])
+        assemble = bool(scenes) and shutil.which("ffmpeg") is not None
+        if scenes and not assemble:
+            logger.warning("ffmpeg not found; rendering the whole video in one Blender run")
+        
+        # Scene updates are written directly; don't let older progress land after them
+        progress.flush()
+        update_job(job_id, lambda job: _start_scenes(job, len(scenes)))
+        
+        # Each scene goes image -> clip on its own, so a finished scene doesn't wait for the others
+        asset_generator = AssetGenerator(blob_store=blob_store, cancel_token=token, deadline=deadline)
+        blender_animator = BlenderAnimator(cancel_token=token, threads=scheduler.render_threads, deadline=deadline)
+        images_dir = os.path.join(job_dir, "assets", "images")
+        
+        def make_image(index):
+            token.raise_if_cancelled()
+            image_stage = f"scene_image:{index}"
+            image_inputs = _inputs_hash(image_stage, scenes[index])
+            restored = _restore(checkpoints, image_stage, image_inputs)
+            if restored:
+                image_path = restored["image"]
+            else:
+                _update_scene(job_id, index, status="generating_image")
+                image_path = asset_generator.generate_scene_image(images_dir, scenes[index], index)
+                if image_path:
+                    _save_checkpoint(job_id, image_stage, image_inputs, {"image": image_path},
+                                     _artifact_entry(blob_store.adopt(image_path)))
+            if image_path:
+                _update_scene(job_id, index, status="image_ready", image=image_path, progress=50)
+            else:
+                # The image stage is over either way; the clip is rendered without one
+                _update_scene(job_id, index, status="image_failed", image=None,
+                              error="No image could be generated", progress=50)
+            return image_path
+        
+        def make_clip(index, image_path):
+            token.raise_if_cancelled()
+            
+            # The clip depends on the scene, the title (shown in the first clip) and the image content
+            clip_stage = f"scene_clip:{index}"
+            clip_inputs = _inputs_hash(clip_stage, scenes[index],
+                                       script_result["script"].get("title") if index == 0 else None,
+                                       _file_sha256(image_path) if image_path else None)
+            restored = _restore(checkpoints, clip_stage, clip_inputs)
+            if restored:
+                clip_path = restored["clip"]
+            else:
+                _update_scene(job_id, index, status="rendering")
+                result = blender_animator.render_scene(job_dir, script_result["script"], index, image_path)
+                if result["status"] != "success":
+                    _update_scene(job_id, index, status="error", error=result.get("error"))
+                    raise RuntimeError(f"Scene {index + 1}: {result.get('error', 'render failed')}")
+                clip_path = result["output_path"]
+                _save_checkpoint(job_id, clip_stage, clip_inputs, {"clip": clip_path},
+                                 _artifact_entry(blob_store.adopt(clip_path)))
+            
+            _update_scene(job_id, index, status="completed", clip=clip_path, progress=100)
+        
+        # Images go to the I/O pool; each scene's render is queued on the CPU
+        # pool as soon as its own image is ready
+        image_paths = [None] * len(scenes)
+        image_futures = {scheduler.submit(IO, deadline.run, "image", make_image, index): index
+                         for index in range(len(scenes))}
+        clip_futures = []
+        try:
+            for future in as_completed(image_futures):
+                index = image_futures[future]
+                image_paths[index] = future.result()
+                if assemble:
+                    clip_futures.append(scheduler.submit(CPU, deadline.run, "clip", make_clip, index, image_paths[index]))
+            for future in clip_futures:
+                future.result()
+        except Exception as e:
+            # Drop the job's waiting stages and abort its running ones, so its
+            # pool slots are free again before the job is reported as failed
+            for future in list(image_futures) + clip_futures:
+                future.cancel()
+            if not isinstance(e, JobCancelled):
+                token.cancel()
+            wait(list(image_futures) + clip_futures)
+            if isinstance(e, JobCancelled):
+                raise
+            
+            logger.error(f"Scene pipeline failed: {e}")
+            progress("error",
+                     error=str(e),
+                     step_name="animation",
+                     step_status="error")
             return
         
-        # Update job with asset output
-        if "assets_path" in assets_result:
-            update_job_output(job_id, {"assets": assets_result["assets_path"]})
-        
-        # Update job status
-        update_job_status(job_id, "processing", 
-                          current_step="Assets generated", 
-                          progress=60,
-                          step_name="asset_generation",
-                          step_status="completed",
-                          step_progress=100)
-        
-        logger.info(f"Assets generated for job {job_id}")
-        
-        # Create animation
-        logger.info(f"Creating animation for job {job_id}")
-        update_job_status(job_id, "processing", 
-                          current_step="Creating animation", 
-                          progress=70,
-                          step_name="animation",
-                          step_status="processing",
-                          step_progress=0)
-        
-        # Call the BlenderAnimator to create the animation
-        blender_animator = BlenderAnimator()
-        animation_result = blender_animator.create_animation(
-            job_dir,
-            script_result["script"],
-            assets_result["assets"],
-            status_callback
-        )
+        update_job_output(job_id, {"assets": [path for path in image_paths if path]})
+        token.raise_if_cancelled()
+        
+        # Assemble the final video
+        progress("processing", 
+                 current_step="Assembling video", 
+                 progress=90,
+                 step_name="rendering",
+                 step_status="processing",
+                 step_progress=0)
+        
+        output_path = os.path.join(job_dir, "output.mp4")
+        if assemble:
+            clips = [os.path.join(job_dir, "scenes", f"scene_{index + 1}.mp4") for index in range(len(scenes))]
+            animation_result = scheduler.run(CPU, deadline.run, "video", blender_animator.concat_clips, clips, output_path)
+        else:
+            animation_result = scheduler.run(
+                CPU,
+                deadline.run, "video",
+                blender_animator.create_animation,
+                job_dir,
+                script_result["script"],
+                {"images": [path for path in image_paths if path], "audio": [], "models": []}
+            )
         
         if animation_result["status"] != "success":
             error_msg = animation_result.get('error', 'Unknown error during animation creation')
             logger.error(f"Animation creation failed: {error_msg}")
-            update_job_status(job_id, "error", 
-                              error=error_msg,
-                              step_name="animation",
-                              step_status="error",
-                              step_progress=0)
+            progress("error", 
+                     error=error_msg,
+                     step_name="rendering",
+                     step_status="error",
+                     step_progress=0)
             return
         
-        # Update job status
-        update_job_status(job_id, "processing", 
-                          current_step="Animation created, rendering video", 
-                          progress=90,
-                          step_name="rendering",
-                          step_status="processing",
-                          step_progress=0)
-        
+        token.raise_if_cancelled()
         logger.info(f"Animation created for job {job_id}")
         
         # Update job with video path
         video_path = animation_result["output_path"]
         logger.info(f"Video generated at {video_path}")
-        update_job_output(job_id, {"video": video_path})
+        artifact = blob_store.adopt(video_path)
+        update_job_output(job_id, {"video": video_path, "artifacts": _artifact_entry(artifact)})
         
         # Mark job as completed
-        update_job_status(job_id, "completed", 
-                          current_step="Video generation completed", 
-                          progress=100,
-                          step_name="rendering",
-                          step_status="completed",
-                          step_progress=100)
+        progress("completed", 
+                 current_step="Video generation completed", 
+                 progress=100,
+                 step_name="rendering",
+                 step_status="completed",
+                 step_progress=100)
         
         logger.info(f"Job {job_id} completed successfully")
+        
+        try:
+            _cache_result(job_id, key)
+        except Exception as e:
+            logger.error(f"Error caching the result of job {job_id}: {e}")
+    
+    except DeadlineExceeded as e:
+        logger.error(str(e))
+        
+        def record(job):
+            job["deadline_exceeded"] = e.to_dict()
+        
+        update_job(job_id, record)
+        progress("error",
+                 error=str(e),
+                 current_step=f"Deadline exceeded in {e.stage}")
+    
+    except JobCancelled:
+        logger.info(f"Job {job_id} cancelled")
+        progress("cancelled",
+                 current_step="Job cancelled by user")
     
     except Exception as e:
         error_msg = f"Error processing job {job_id}: {str(e)}\n{traceback.format_exc()}"
         logger.error(error_msg)
-        update_job_status(job_id, "error", 
-                          error=str(e),
-                          current_step="Error during processing")
+        progress("error", 
+                 error=str(e),
+                 current_step="Error during processing")
+    
+    finally:
+        progress.close()
+        deadline.stop()
+        cancellation.release(job_id, token)
@@ -0,0 +1,393 @@
+import os
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted to a queue that is already at capacity."""
+
+    def __init__(self, depth: int, max_depth: int):
+        super().__init__(f"Job queue is full ({depth}/{max_depth} jobs waiting)")
+        self.depth = depth
+        self.max_depth = max_depth
+
+class JobRunningError(Exception):
+    """Raised when a job is re-queued while a worker still holds its lease."""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Job {job_id} is still running")
+        self.job_id = job_id
+
+class JobQueue:
+    """
+    Bounded, persistent queue of jobs served by a fixed pool of worker threads.
+
+    Entries live in a SQLite table, so queued jobs survive a restart and
+    several processes sharing the database draw from one queue. Workers take
+    the highest priority entry first and, within a priority, the oldest.
+    At most max_depth jobs may wait; further submissions raise
+    QueueFullError so callers can push back instead of piling up work.
+
+    A claimed job is leased to its worker for lease_duration seconds and the
+    lease is renewed by a heartbeat while the job runs. If the worker dies,
+    the lease runs out and another worker claims the job again, up to
+    max_attempts times. A process that only submits jobs (e.g. the API)
+    creates the queue without a handler and never calls start().
+    """
+
+    def __init__(self, db_file: str, handler: Optional[Callable[[str, float], None]] = None,
+                 workers: int = 2, max_depth: int = 100, poll_interval: float = 1.0,
+                 lease_duration: float = 60, max_attempts: int = 3,
+                 on_abandoned: Optional[Callable[[str], None]] = None):
+        """
+        Initialize the queue. Workers run once start() is called.
+
+        Args:
+            db_file (str): Path to the SQLite database file
+            handler (callable, optional): Called by a worker for each job as
+                handler(job_id, wait), wait being the seconds the job was queued
+            workers (int): Number of worker threads; jobs beyond this many wait
+            max_depth (int): Maximum number of waiting jobs
+            poll_interval (float): Seconds an idle worker waits before checking
+                for jobs queued by other processes
+            lease_duration (float): Seconds a claimed job stays leased without
+                a heartbeat; heartbeats are sent every third of this
+            max_attempts (int): Claims a job gets before a job whose lease
+                keeps expiring is dropped
+            on_abandoned (callable, optional): Called with the job ID when a
+                job is dropped after max_attempts
+        """
+        self.db_file = db_file
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.poll_interval = poll_interval
+        self.lease_duration = lease_duration
+        self.max_attempts = max_attempts
+        self.on_abandoned = on_abandoned
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+
+        self._local = threading.local()
+        self._available = threading.Condition()
+        self._running = 0
+        self._stopped = False
+
+        conn = self._connect()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_queue (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL UNIQUE,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    state TEXT NOT NULL DEFAULT 'queued',
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL
+                )
+            """)
+            # Lease columns were added after the table; upgrade older databases in place
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(job_queue)")}
+            for column, definition in (("worker_id", "TEXT"),
+                                       ("lease_expires_at", "REAL"),
+                                       ("attempts", "INTEGER NOT NULL DEFAULT 0")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE job_queue ADD COLUMN {column} {definition}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_queue_order ON job_queue (state, priority DESC, seq)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS queue_workers (
+                    worker_id TEXT PRIMARY KEY,
+                    threads INTEGER NOT NULL,
+                    started_at REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                )
+            """)
+
+        self._threads = []
+
+        logger.info(f"JobQueue initialized with {workers} workers (max depth {max_depth}) in {db_file}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, opening it if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, job_id: str, priority: int = 0, bounded: bool = True) -> Dict[str, Any]:
+        """
+        Add a job to the queue.
+
+        Enqueueing a job that is already in the queue puts it back in the
+        queued state at its original position, which is how interrupted jobs
+        are resumed. A job that is running under a live lease is left alone,
+        so it never runs twice at once.
+
+        Args:
+            job_id (str): The job ID
+            priority (int): Higher priorities are served first
+            bounded (bool): Enforce max_depth; recovery re-queues regardless
+
+        Returns:
+            dict: {"position": 1-based position among waiting jobs, "depth": waiting jobs}
+
+        Raises:
+            QueueFullError: If max_depth jobs are already waiting
+            JobRunningError: If a worker is still running the job
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            depth = conn.execute("SELECT COUNT(*) FROM job_queue WHERE state = 'queued'").fetchone()[0]
+            existing = conn.execute(
+                "SELECT state, lease_expires_at FROM job_queue WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if existing is not None and existing[0] == 'running' and (existing[1] or 0) >= now:
+                raise JobRunningError(job_id)
+            if existing is None:
+                if bounded and depth >= self.max_depth:
+                    raise QueueFullError(depth, self.max_depth)
+                conn.execute(
+                    "INSERT INTO job_queue (job_id, priority, enqueued_at) VALUES (?, ?, ?)",
+                    (job_id, priority, now)
+                )
+            else:
+                conn.execute(
+                    "UPDATE job_queue SET state = 'queued', started_at = NULL, worker_id = NULL, "
+                    "lease_expires_at = NULL, attempts = 0 WHERE job_id = ?",
+                    (job_id,)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        with self._available:
+            self._available.notify()
+
+        return {"position": self.position(job_id), "depth": self.depth()}
+
+    def remove(self, job_id: str) -> bool:
+        """
+        Remove a job that has not started yet.
+
+        Returns:
+            bool: True if the job was waiting in the queue
+        """
+        cursor = self._connect().execute(
+            "DELETE FROM job_queue WHERE job_id = ? AND state = 'queued'", (job_id,)
+        )
+        return cursor.rowcount > 0
+
+    def position(self, job_id: str) -> Optional[int]:
+        """
+        Get a waiting job's 1-based position in the queue.
+
+        Returns:
+            int: The position, or None if the job is not waiting
+        """
+        row = self._connect().execute(
+            "SELECT priority, seq FROM job_queue WHERE job_id = ? AND state = 'queued'", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        priority, seq = row
+        ahead = self._connect().execute(
+            "SELECT COUNT(*) FROM job_queue WHERE state = 'queued' "
+            "AND (priority > ? OR (priority = ? AND seq < ?))",
+            (priority, priority, seq)
+        ).fetchone()[0]
+        return ahead + 1
+
+    def __contains__(self, job_id: str) -> bool:
+        """Check whether a job is waiting or leased to a worker."""
+        return self._connect().execute(
+            "SELECT 1 FROM job_queue WHERE job_id = ?", (job_id,)
+        ).fetchone() is not None
+
+    def depth(self) -> int:
+        """Get the number of waiting jobs."""
+        return self._connect().execute("SELECT COUNT(*) FROM job_queue WHERE state = 'queued'").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth, running jobs, live workers and the age of the oldest waiting job."""
+        conn = self._connect()
+        now = time.time()
+        oldest = conn.execute("SELECT MIN(enqueued_at) FROM job_queue WHERE state = 'queued'").fetchone()[0]
+        processes, threads = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(threads), 0) FROM queue_workers WHERE heartbeat_at > ?",
+            (now - self.lease_duration,)
+        ).fetchone()
+        return {
+            "depth": self.depth(),
+            "max_depth": self.max_depth,
+            "running": conn.execute("SELECT COUNT(*) FROM job_queue WHERE state = 'running'").fetchone()[0],
+            "worker_processes": processes,
+            "workers": threads,
+            "oldest_wait": round(now - oldest, 3) if oldest else 0
+        }
+
+    def _claim(self) -> Optional[tuple]:
+        """
+        Lease the next job to this worker, marking it running.
+
+        Jobs whose lease has run out (their worker died) are claimed like
+        waiting ones; those already claimed max_attempts times are dropped
+        and passed to on_abandoned instead.
+
+        Returns:
+            tuple: (job ID, seconds it waited), or None if the queue is empty
+        """
+        abandoned = []
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            # Running entries without a lease predate leases; their worker is gone
+            expired = "state = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+            for (job_id,) in conn.execute(
+                f"SELECT job_id FROM job_queue WHERE {expired} AND attempts >= ?", (now, self.max_attempts)
+            ).fetchall():
+                conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+                abandoned.append(job_id)
+
+            row = conn.execute(
+                f"SELECT job_id, enqueued_at, state FROM job_queue WHERE state = 'queued' OR ({expired}) "
+                "ORDER BY priority DESC, seq LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE job_queue SET state = 'running', started_at = ?, worker_id = ?, "
+                    "lease_expires_at = ?, attempts = attempts + 1 WHERE job_id = ?",
+                    (now, self.worker_id, now + self.lease_duration, row[0])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        for job_id in abandoned:
+            logger.error(f"Dropping job {job_id}: its worker stopped responding {self.max_attempts} times")
+            if self.on_abandoned is not None:
+                try:
+                    self.on_abandoned(job_id)
+                except Exception as e:
+                    logger.error(f"Error handling abandoned job {job_id}: {e}")
+
+        if row is None:
+            return None
+        if row[2] == 'running':
+            logger.warning(f"Reclaiming job {row[0]} from a worker whose lease expired")
+        return (row[0], now - row[1])
+
+    def _heartbeat(self) -> None:
+        """Renew the leases of this worker's jobs and record that it is alive."""
+        interval = self.lease_duration / 3
+        while not self._stopped:
+            try:
+                now = time.time()
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "UPDATE job_queue SET lease_expires_at = ? WHERE worker_id = ? AND state = 'running'",
+                        (now + self.lease_duration, self.worker_id)
+                    )
+                    conn.execute(
+                        "UPDATE queue_workers SET heartbeat_at = ? WHERE worker_id = ?",
+                        (now, self.worker_id)
+                    )
+            except Exception as e:
+                logger.error(f"Error renewing job leases: {e}")
+            with self._available:
+                self._available.wait(interval)
+
+    def _work(self) -> None:
+        while not self._stopped:
+            try:
+                claimed = self._claim()
+            except Exception as e:
+                logger.error(f"Error taking job from queue: {e}")
+                claimed = None
+
+            if claimed is None:
+                with self._available:
+                    self._available.wait(self.poll_interval)
+                continue
+
+            job_id, wait = claimed
+            with self._available:
+                self._running += 1
+            try:
+                self.handler(job_id, wait)
+            except Exception as e:
+                logger.error(f"Error processing queued job {job_id}: {e}")
+            finally:
+                with self._available:
+                    self._running -= 1
+                try:
+                    # Only if still ours: after a lapsed lease another worker may own the job
+                    self._connect().execute(
+                        "DELETE FROM job_queue WHERE job_id = ? AND state = 'running' AND worker_id = ?",
+                        (job_id, self.worker_id)
+                    )
+                except Exception as e:
+                    logger.error(f"Error removing job {job_id} from queue: {e}")
+
+    def start(self) -> None:
+        """Start the worker threads and the lease heartbeat."""
+        if self.handler is None:
+            raise RuntimeError("JobQueue needs a handler to run workers")
+        if self._threads:
+            return
+
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            # Forget workers that stopped heartbeating long ago
+            conn.execute("DELETE FROM queue_workers WHERE heartbeat_at < ?", (now - 10 * self.lease_duration,))
+            conn.execute(
+                "INSERT OR REPLACE INTO queue_workers (worker_id, threads, started_at, heartbeat_at) VALUES (?, ?, ?, ?)",
+                (self.worker_id, self.workers, now, now)
+            )
+
+        heartbeat = threading.Thread(target=self._heartbeat, name="job-queue-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the workers after their current jobs.
+
+        Args:
+            timeout (float, optional): Seconds to wait for running jobs to
+                finish; their leases lapse and they are re-run elsewhere if
+                the process exits before they do
+        """
+        self._stopped = True
+        with self._available:
+            self._available.notify_all()
+
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0, deadline - time.time()))
+
+        try:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM queue_workers WHERE worker_id = ?", (self.worker_id,))
+        except Exception as e:
+            logger.error(f"Error unregistering worker {self.worker_id}: {e}")
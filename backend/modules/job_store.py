@@ -0,0 +1,802 @@
+import os
+import copy
+import atexit
+import bisect
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+
+from modules.models import Job, job_delta
+from modules.file_lock import FileLock
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Fields kept in the jobs.json summary list
+SUMMARY_FIELDS = ("job_id", "prompt", "created_at", "status", "progress")
+
+# Statuses after which a job no longer changes
+TERMINAL_STATUSES = {"completed", "error", "cancelled", "canceled"}
+
+# Statuses of jobs that are queued or being worked on
+ACTIVE_STATUSES = {"pending", "initializing", "processing"}
+
+
+def job_summary(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the summary entry returned by get_jobs for a job."""
+    return {
+        "job_id": job["job_id"],
+        "prompt": job.get("prompt"),
+        "created_at": job.get("created_at"),
+        "status": job.get("status"),
+        "progress": job.get("progress", 0)
+    }
+
+
+class JournalJobStore:
+    """
+    Flat-file job store backed by an append-only journal.
+
+    All jobs are held in memory. Creating a job appends its full record to
+    the journal for the current day (journal/journal-YYYYMMDD.jsonl); every
+    later change appends a single delta line holding only the fields that
+    changed. A background compactor periodically folds the journal into
+    journal/snapshot.json, refreshes jobs.json and deletes the journal files
+    the snapshot covers. On startup the state is rebuilt from the snapshot
+    plus whatever journal was written after it.
+
+    Since the state lives in one process's memory, the store takes an
+    exclusive lock on the journal directory and refuses to open a journal
+    that another process already owns.
+    """
+
+    def __init__(self, journal_dir: str, jobs_file: str,
+                 legacy_jobs_dir: Optional[str] = None,
+                 compact_interval: float = 60.0):
+        """
+        Initialize the journal job store.
+
+        Args:
+            journal_dir (str): Directory holding the journal and snapshot files
+            jobs_file (str): Path to the jobs.json summary list refreshed on compaction
+            legacy_jobs_dir (str, optional): Directory of per-job JSON files to
+                import when no snapshot exists yet
+            compact_interval (float): Seconds between background compactions
+        """
+        self.journal_dir = journal_dir
+        self.jobs_file = jobs_file
+        self.snapshot_file = os.path.join(journal_dir, "snapshot.json")
+        self.compact_interval = compact_interval
+
+        os.makedirs(journal_dir, exist_ok=True)
+
+        # Held for the life of the process
+        self._owner_lock = FileLock(os.path.join(journal_dir, ".lock"))
+        if not self._owner_lock.acquire(blocking=False):
+            raise RuntimeError(f"Journal {journal_dir} is in use by another process; "
+                               "use the sqlite store to share jobs between processes")
+
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        # (created_at, job_id) keys in ascending order, for keyset pagination
+        self._order: List[tuple] = []
+        self._lock = threading.Lock()
+        self._journal = None
+        self._journal_name = None
+        self._dirty = False
+
+        self._load(legacy_jobs_dir)
+
+        # Start the background compactor
+        self._compactor = threading.Thread(target=self._compact_loop, daemon=True)
+        self._compactor.start()
+
+        logger.info(f"JournalJobStore initialized with {len(self._jobs)} jobs from {journal_dir}")
+
+    def _journal_files(self) -> List[str]:
+        return sorted(
+            f for f in os.listdir(self.journal_dir)
+            if f.startswith("journal-") and f.endswith(".jsonl")
+        )
+
+    def _load(self, legacy_jobs_dir: Optional[str]) -> None:
+        """Rebuild in-memory state from the snapshot and the journal tail."""
+        position = None
+
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r') as f:
+                snapshot = json.load(f)
+            self._jobs = snapshot["jobs"]
+            position = snapshot.get("position")
+        elif legacy_jobs_dir and os.path.isdir(legacy_jobs_dir):
+            for filename in os.listdir(legacy_jobs_dir):
+                if not filename.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(legacy_jobs_dir, filename), 'r') as f:
+                        job = json.load(f)
+                    self._jobs[job["job_id"]] = job
+                except Exception as e:
+                    logger.error(f"Error importing job file {filename}: {e}")
+
+            # Keep the order of the legacy jobs.json list
+            self._jobs = dict(sorted(self._jobs.items(), key=lambda item: item[1].get("created_at") or 0))
+            self._dirty = bool(self._jobs)
+
+        replayed = 0
+        for name in self._journal_files():
+            offset = 0
+            if position:
+                if name < position["file"]:
+                    continue
+                if name == position["file"]:
+                    offset = position["offset"]
+
+            with open(os.path.join(self.journal_dir, name), 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Torn write from a crash; everything before it is intact
+                        logger.warning(f"Ignoring incomplete journal record in {name}")
+                        break
+                    self._apply(json.loads(line))
+                    replayed += 1
+
+        if replayed:
+            self._dirty = True
+            logger.info(f"Replayed {replayed} journal records")
+
+        self._order = sorted((job.get("created_at") or 0, job_id) for job_id, job in self._jobs.items())
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        """Apply a journal record to the in-memory state."""
+        if record["op"] == "create":
+            self._jobs[record["job"]["job_id"]] = record["job"]
+            return
+        if record["op"] == "delete":
+            self._jobs.pop(record["job_id"], None)
+            return
+
+        job = self._jobs.get(record["job_id"])
+        if job is None:
+            return
+
+        job.update(record.get("set", {}))
+        for key in record.get("unset", []):
+            job.pop(key, None)
+
+        step_changes = record.get("steps")
+        if step_changes:
+            for step in job.get("steps", []):
+                if step["name"] in step_changes:
+                    step.update(step_changes[step["name"]])
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        """Append a record to today's journal file. Caller holds the lock."""
+        name = time.strftime("journal-%Y%m%d.jsonl")
+        if name != self._journal_name:
+            if self._journal:
+                self._journal.close()
+            self._journal = open(os.path.join(self.journal_dir, name), 'ab')
+            self._journal_name = name
+
+        self._journal.write(json.dumps(record, separators=(',', ':')).encode() + b"\n")
+        self._journal.flush()
+        self._dirty = True
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Get the summary list of all jobs."""
+        with self._lock:
+            return [job_summary(job) for job in self._jobs.values()]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a full job record, or None if it doesn't exist."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else None
+
+    def insert(self, job: Dict[str, Any]) -> None:
+        """Save a new job."""
+        with self._lock:
+            job = copy.deepcopy(job)
+            self._append({"op": "create", "job": job})
+            self._jobs[job["job_id"]] = job
+            bisect.insort(self._order, (job.get("created_at") or 0, job["job_id"]))
+
+    def update(self, job: Dict[str, Any]) -> None:
+        """Save an existing job as a delta against the stored record."""
+        self.compare_and_swap(job, None)
+
+    def compare_and_swap(self, job: Dict[str, Any], expected_version: Optional[int]) -> bool:
+        """
+        Save an existing job only if its stored version is expected_version.
+
+        Passing None for expected_version skips the version check.
+        """
+        with self._lock:
+            old = self._jobs.get(job["job_id"])
+            if old is None:
+                raise ValueError(f"Job {job['job_id']} not found")
+            if expected_version is not None and old.get("version", 0) != expected_version:
+                return False
+
+            record = {"op": "update", "job_id": job["job_id"], **job_delta(old, job)}
+            if len(record) > 2:
+                self._append(record)
+                self._apply(copy.deepcopy(record))
+            return True
+
+    def delete(self, job_id: str) -> None:
+        """Remove a job."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+
+            self._append({"op": "delete", "job_id": job_id})
+            del self._jobs[job_id]
+
+            key = (job.get("created_at") or 0, job_id)
+            index = bisect.bisect_left(self._order, key)
+            if index < len(self._order) and self._order[index] == key:
+                del self._order[index]
+
+    def page(self, limit: int, after: Optional[tuple] = None,
+             statuses: Optional[List[str]] = None,
+             created_after: Optional[float] = None,
+             created_before: Optional[float] = None,
+             full: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get a page of jobs, newest first.
+
+        Args:
+            limit (int): Maximum number of jobs to return
+            after (tuple, optional): (created_at, job_id) key of the last job
+                on the previous page
+            statuses (list, optional): Only include jobs with these statuses
+            created_after (float, optional): Only include jobs created at or after this time
+            created_before (float, optional): Only include jobs created before this time
+            full (bool): Return full records instead of summaries
+
+        Returns:
+            list: Jobs in (created_at, job_id) descending order
+        """
+        with self._lock:
+            end = len(self._order)
+            if after is not None:
+                end = bisect.bisect_left(self._order, tuple(after))
+            if created_before is not None:
+                end = min(end, bisect.bisect_left(self._order, (created_before,)))
+
+            jobs = []
+            for index in range(end - 1, -1, -1):
+                created_at, job_id = self._order[index]
+                if created_after is not None and created_at < created_after:
+                    break
+                job = self._jobs[job_id]
+                if statuses and job.get("status") not in statuses:
+                    continue
+                jobs.append(copy.deepcopy(job) if full else job_summary(job))
+                if len(jobs) >= limit:
+                    break
+            return jobs
+
+    def compact(self) -> None:
+        """Fold the journal into a new snapshot and drop covered journal files."""
+        with self._lock:
+            if not self._dirty:
+                return
+
+            # Flush so the snapshot position falls on a record boundary
+            if self._journal:
+                self._journal.flush()
+            position = None
+            if self._journal_name:
+                position = {
+                    "file": self._journal_name,
+                    "offset": os.path.getsize(os.path.join(self.journal_dir, self._journal_name))
+                }
+            snapshot = json.dumps({"position": position, "jobs": self._jobs})
+            summaries = [job_summary(job) for job in self._jobs.values()]
+            self._dirty = False
+
+        # Write the snapshot atomically
+        tmp_file = f"{self.snapshot_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.snapshot_file)
+
+        # Refresh jobs.json for tools that read it directly
+        tmp_file = f"{self.jobs_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(summaries, f, indent=2)
+        os.replace(tmp_file, self.jobs_file)
+
+        # Journal files before the snapshot position are fully covered
+        if position:
+            for name in self._journal_files():
+                if name < position["file"]:
+                    os.remove(os.path.join(self.journal_dir, name))
+
+        logger.info(f"Compacted job journal into snapshot ({len(summaries)} jobs)")
+
+    def _compact_loop(self) -> None:
+        while True:
+            time.sleep(self.compact_interval)
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Error compacting job journal: {e}")
+
+
+class SqliteJobStore:
+    """
+    Stores jobs in a SQLite database running in WAL mode.
+
+    Each job is one row keyed by job_id; the full record is kept as JSON in
+    the data column and the fields used for listing and filtering are kept
+    in indexed columns, so an update touches a single row regardless of how
+    many jobs are stored.
+    """
+
+    # Bumped whenever the schema changes; stored in PRAGMA user_version
+    SCHEMA_VERSION = 2
+
+    COLUMNS = ("job_id", "prompt", "status", "progress", "created_at", "updated_at", "version", "data")
+
+    def __init__(self, db_file: str, legacy_jobs_dir: Optional[str] = None):
+        """
+        Initialize the SQLite job store.
+
+        Args:
+            db_file (str): Path to the SQLite database file
+            legacy_jobs_dir (str, optional): Directory of per-job JSON files to
+                import the first time the database is initialized
+        """
+        self.db_file = db_file
+        self._local = threading.local()
+
+        conn = self._connect()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_records (
+                    job_id TEXT PRIMARY KEY,
+                    prompt TEXT,
+                    status TEXT,
+                    progress NUMERIC,
+                    created_at REAL,
+                    updated_at REAL,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    data TEXT NOT NULL
+                )
+            """)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(job_records)")]
+            if "version" not in columns:
+                conn.execute("ALTER TABLE job_records ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_records_status ON job_records (status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_records_created_at ON job_records (created_at, job_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_job_records_status_created_at ON job_records (status, created_at, job_id)")
+
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < self.SCHEMA_VERSION:
+            if version == 0 and legacy_jobs_dir:
+                self._import_json_jobs(legacy_jobs_dir)
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+        logger.info(f"SqliteJobStore initialized with database: {db_file}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, opening it if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _import_json_jobs(self, jobs_dir: str) -> None:
+        """Import per-job JSON files written by the JSON store."""
+        if not os.path.isdir(jobs_dir):
+            return
+
+        imported = 0
+        conn = self._connect()
+        with conn:
+            for filename in os.listdir(jobs_dir):
+                if not filename.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(jobs_dir, filename), 'r') as f:
+                        job = json.load(f)
+                    conn.execute(self._insert_sql("INSERT OR IGNORE"), self._row(job))
+                    imported += 1
+                except Exception as e:
+                    logger.error(f"Error importing job file {filename}: {e}")
+
+        logger.info(f"Imported {imported} jobs from {jobs_dir}")
+
+    @classmethod
+    def _insert_sql(cls, verb: str = "INSERT") -> str:
+        return f"{verb} INTO job_records ({', '.join(cls.COLUMNS)}) VALUES ({', '.join('?' * len(cls.COLUMNS))})"
+
+    @staticmethod
+    def _row(job: Dict[str, Any]) -> tuple:
+        return (
+            job["job_id"],
+            job.get("prompt"),
+            job.get("status"),
+            job.get("progress", 0),
+            job.get("created_at"),
+            job.get("updated_at"),
+            job.get("version", 0),
+            json.dumps(job)
+        )
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Get the summary list of all jobs, oldest first."""
+        rows = self._connect().execute(
+            "SELECT job_id, prompt, created_at, status, progress FROM job_records "
+            "ORDER BY created_at, job_id"
+        ).fetchall()
+        return [dict(zip(SUMMARY_FIELDS, row)) for row in rows]
+
+    def page(self, limit: int, after: Optional[tuple] = None,
+             statuses: Optional[List[str]] = None,
+             created_after: Optional[float] = None,
+             created_before: Optional[float] = None,
+             full: bool = False) -> List[Dict[str, Any]]:
+        """Get a page of jobs, newest first. See JournalJobStore.page."""
+        clauses = []
+        params: List[Any] = []
+
+        if after is not None:
+            clauses.append("(created_at < ? OR (created_at = ? AND job_id < ?))")
+            params += [after[0], after[0], after[1]]
+        if statuses:
+            clauses.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params += list(statuses)
+        if created_after is not None:
+            clauses.append("created_at >= ?")
+            params.append(created_after)
+        if created_before is not None:
+            clauses.append("created_at < ?")
+            params.append(created_before)
+
+        columns = "data" if full else ", ".join(SUMMARY_FIELDS)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT {columns} FROM job_records {where}"
+            "ORDER BY created_at DESC, job_id DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+
+        if full:
+            return [json.loads(row[0]) for row in rows]
+        return [dict(zip(SUMMARY_FIELDS, row)) for row in rows]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a full job record, or None if it doesn't exist."""
+        row = self._connect().execute(
+            "SELECT data FROM job_records WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def insert(self, job: Dict[str, Any]) -> None:
+        """Save a new job."""
+        conn = self._connect()
+        with conn:
+            conn.execute(self._insert_sql(), self._row(job))
+
+    def update(self, job: Dict[str, Any]) -> None:
+        """Save an existing job."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE job_records SET prompt = ?, status = ?, progress = ?, "
+                "created_at = ?, updated_at = ?, version = ?, data = ? WHERE job_id = ?",
+                self._row(job)[1:] + (job["job_id"],)
+            )
+
+    def delete(self, job_id: str) -> None:
+        """Remove a job."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM job_records WHERE job_id = ?", (job_id,))
+
+    def compare_and_swap(self, job: Dict[str, Any], expected_version: int) -> bool:
+        """Save an existing job only if its stored version is expected_version."""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE job_records SET prompt = ?, status = ?, progress = ?, "
+                "created_at = ?, updated_at = ?, version = ?, data = ? "
+                "WHERE job_id = ? AND version = ?",
+                self._row(job)[1:] + (job["job_id"], expected_version)
+            )
+        return cursor.rowcount == 1
+
+
+class CachedJobStore:
+    """
+    Write-behind cache in front of another job store.
+
+    Reads are served from memory once a job has been seen. Updates only
+    replace the cached record and mark the job dirty, so a burst of progress
+    updates to the same job collapses into one backend write. Dirty jobs are
+    flushed by a background thread every flush_interval seconds, and
+    immediately when a job reaches a terminal status. Creates are written
+    through so new jobs are durable straight away. Cached jobs are held as
+    slot-based Job objects rather than nested dicts to keep them compact.
+
+    When several processes share the backend, pass their shared status
+    table: updates are then written through, and a cached job is only
+    served while its version matches the table, so a change made by another
+    process is picked up on the next read.
+    """
+
+    def __init__(self, backend, flush_interval: float = 1.0, max_entries: int = 1000,
+                 shared_status=None):
+        """
+        Initialize the cache.
+
+        Args:
+            backend: The job store to cache (list/get/insert/update interface)
+            flush_interval (float): Seconds between background flushes
+            max_entries (int): Maximum number of clean jobs kept in memory
+            shared_status (SharedStatusTable, optional): Versions published by
+                all processes; enables write-through mode
+        """
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self.shared_status = shared_status
+
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._dirty: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes backend writes so an older copy never overwrites a newer one
+        self._flush_lock = threading.Lock()
+
+        self._stats = {
+            "updates": 0,
+            "coalesced": 0,
+            "flushes": 0,
+            "flush_cycles": 0,
+            "hits": 0,
+            "misses": 0
+        }
+
+        if shared_status is None:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+            logger.info(f"CachedJobStore initialized (flush interval {flush_interval}s)")
+        else:
+            logger.info("CachedJobStore initialized (write-through, shared status)")
+
+    def _remember(self, job: Dict[str, Any]) -> None:
+        """Cache a job and evict the least recently used clean jobs. Caller holds the lock."""
+        self._jobs[job["job_id"]] = Job.from_dict(job)
+        self._jobs.move_to_end(job["job_id"])
+
+        while len(self._jobs) > self.max_entries:
+            for job_id in self._jobs:
+                if job_id not in self._dirty:
+                    del self._jobs[job_id]
+                    break
+            else:
+                break
+
+    def _mark_dirty(self, job: Dict[str, Any]) -> None:
+        """Replace the cached copy of a job and queue it for flushing. Caller holds the lock."""
+        self._stats["updates"] += 1
+        if job["job_id"] in self._dirty:
+            self._stats["coalesced"] += 1
+        else:
+            self._dirty[job["job_id"]] = None
+        self._remember(job)
+
+    def _is_stale(self, job: Job) -> bool:
+        """
+        Check whether another process may have written a newer version of a cached job.
+
+        A job missing from the shared table (no free slot, or its slot was
+        reused) can't be checked, so it is always read from the backend.
+        """
+        if self.shared_status is None:
+            return False
+        version = self.shared_status.version(job["job_id"])
+        return version == 0 or version > job.get("version", 0)
+
+    def _write_through(self, job: Dict[str, Any], expected_version: Optional[int] = None) -> bool:
+        """Write a job straight to the backend and cache it. Used in shared mode."""
+        job_id = job["job_id"]
+        if expected_version is None:
+            self.backend.update(job)
+        elif not self.backend.compare_and_swap(job, expected_version):
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            return False
+
+        with self._lock:
+            self._stats["updates"] += 1
+            self._stats["flushes"] += 1
+            self._remember(job)
+        return True
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Get the summary list of all jobs, including unflushed changes."""
+        jobs = self.backend.list()
+        with self._lock:
+            for summary in jobs:
+                if summary["job_id"] in self._dirty:
+                    cached = self._jobs[summary["job_id"]]
+                    summary["status"] = cached.get("status")
+                    summary["progress"] = cached.get("progress", 0)
+        return jobs
+
+    def page(self, limit: int, after: Optional[tuple] = None,
+             statuses: Optional[List[str]] = None,
+             created_after: Optional[float] = None,
+             created_before: Optional[float] = None,
+             full: bool = False) -> List[Dict[str, Any]]:
+        """Get a page of jobs, newest first, including unflushed changes."""
+        if statuses:
+            # The backend filters on status, so it must see pending changes
+            self.flush()
+
+        jobs = self.backend.page(limit, after, statuses, created_after, created_before, full)
+        with self._lock:
+            for index, job in enumerate(jobs):
+                if job["job_id"] not in self._dirty:
+                    continue
+                cached = self._jobs[job["job_id"]]
+                if full:
+                    jobs[index] = cached.to_dict()
+                else:
+                    job["status"] = cached.get("status")
+                    job["progress"] = cached.get("progress", 0)
+        return jobs
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job, from memory when cached."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and self._is_stale(job):
+                del self._jobs[job_id]
+                job = None
+            if job is not None:
+                self._stats["hits"] += 1
+                self._jobs.move_to_end(job_id)
+                return job.to_dict()
+            self._stats["misses"] += 1
+
+        job = self.backend.get(job_id)
+        if job is not None:
+            with self._lock:
+                # Don't clobber a newer copy cached while we were reading
+                if job_id not in self._jobs:
+                    self._remember(job)
+        return job
+
+    def insert(self, job: Dict[str, Any]) -> None:
+        """Save a new job, writing it through to the backend."""
+        self.backend.insert(job)
+        with self._lock:
+            self._remember(job)
+
+    def update(self, job: Dict[str, Any]) -> None:
+        """Save an existing job in memory; it is written to the backend later."""
+        if self.shared_status is not None:
+            self._write_through(job)
+            return
+
+        with self._lock:
+            self._mark_dirty(job)
+
+        if job.get("status") in TERMINAL_STATUSES:
+            self.flush(job["job_id"])
+
+    def compare_and_swap(self, job: Dict[str, Any], expected_version: int) -> bool:
+        """Save an existing job in memory only if its cached version is expected_version."""
+        if self.shared_status is not None:
+            # Other processes write to the backend too, so it has to do the check
+            return self._write_through(job, expected_version)
+
+        job_id = job["job_id"]
+        with self._lock:
+            cached = self._jobs.get(job_id)
+
+        if cached is None:
+            # Load it so the version check has something to compare against
+            if self.get(job_id) is None:
+                raise ValueError(f"Job {job_id} not found")
+
+        with self._lock:
+            cached = self._jobs.get(job_id)
+            if cached is not None and cached.get("version", 0) != expected_version:
+                return False
+
+            self._mark_dirty(job)
+
+        if job.get("status") in TERMINAL_STATUSES:
+            self.flush(job_id)
+        return True
+
+    def delete(self, job_id: str) -> None:
+        """Remove a job from the cache and the backend."""
+        with self._flush_lock:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._dirty.pop(job_id, None)
+            self.backend.delete(job_id)
+
+    def flush(self, job_id: Optional[str] = None) -> int:
+        """
+        Write dirty jobs to the backend.
+
+        Args:
+            job_id (str, optional): Only flush this job
+
+        Returns:
+            int: Number of jobs written
+        """
+        written = 0
+        with self._flush_lock:
+            with self._lock:
+                if job_id is None:
+                    pending = list(self._dirty)
+                else:
+                    pending = [job_id] if job_id in self._dirty else []
+
+            for pending_id in pending:
+                with self._lock:
+                    if pending_id not in self._dirty:
+                        continue
+                    del self._dirty[pending_id]
+                    job = self._jobs[pending_id].to_dict()
+
+                try:
+                    self.backend.update(job)
+                    written += 1
+                except Exception as e:
+                    logger.error(f"Error flushing job {pending_id}: {e}")
+                    with self._lock:
+                        self._dirty[pending_id] = None
+
+            with self._lock:
+                self._stats["flushes"] += written
+                if written:
+                    self._stats["flush_cycles"] += 1
+
+        if written:
+            logger.debug(f"Flushed {written} jobs to the backend")
+        return written
+
+    def stats(self) -> Dict[str, Any]:
+        """Get flush and coalescing counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["dirty"] = len(self._dirty)
+            stats["cached"] = len(self._jobs)
+
+        stats["coalescing_ratio"] = (
+            round(stats["updates"] / stats["flushes"], 2) if stats["flushes"] else None
+        )
+        return stats
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing job cache: {e}")
@@ -0,0 +1,242 @@
+import sys
+import copy
+import logging
+from typing import Dict, Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Pipeline steps every job goes through, with their initial messages
+DEFAULT_STEPS = (
+    ("script_generation", "Waiting to start"),
+    ("asset_generation", "Waiting for script generation"),
+    ("animation", "Waiting for asset generation"),
+    ("rendering", "Waiting for animation")
+)
+
+
+# Sentinel for fields missing from one side of a comparison
+_MISSING = object()
+
+
+def _intern(value: Any) -> Any:
+    """Intern short strings that repeat across many jobs (statuses, step names)."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def job_delta(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Describe the change between two versions of a job (or job status) dict.
+
+    Returns:
+        dict: "set" holds changed or added top-level fields, "steps" maps step
+            names to their changed fields, and "unset" lists removed fields.
+            Keys with nothing to report are omitted, so an unchanged job
+            gives an empty dict.
+    """
+    changed = {}
+    for key, value in new.items():
+        if key == "steps" or old.get(key, _MISSING) == value:
+            continue
+        changed[key] = value
+
+    old_steps = {step["name"]: step for step in old.get("steps", [])}
+    step_changes = {}
+    for step in new.get("steps", []):
+        previous = old_steps.get(step["name"])
+        if previous is None:
+            # Steps were added or renamed; report the whole list
+            changed["steps"] = new["steps"]
+            step_changes = {}
+            break
+        diff = {k: v for k, v in step.items() if previous.get(k, _MISSING) != v}
+        if diff:
+            step_changes[step["name"]] = diff
+
+    removed = [key for key in old if key not in new]
+
+    delta = {}
+    if changed:
+        delta["set"] = changed
+    if step_changes:
+        delta["steps"] = step_changes
+    if removed:
+        delta["unset"] = removed
+    return delta
+
+
+class Step:
+    """A single pipeline step of a job."""
+
+    __slots__ = ("name", "status", "progress", "message")
+
+    def __init__(self, name: str, status: str = "pending", progress: Any = 0, message: str = ""):
+        self.name = _intern(name)
+        self.status = _intern(status)
+        self.progress = progress
+        self.message = message
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Step":
+        return cls(
+            data["name"],
+            data.get("status", "pending"),
+            data.get("progress", 0),
+            data.get("message", "")
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message
+        }
+
+    # Dict-style access so code written against the JSON shape keeps working
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, _intern(value) if key in ("name", "status") else value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+
+class Job:
+    """
+    In-memory job record.
+
+    Known fields live in slots and steps are indexed by name, so a step
+    update is a dict lookup instead of a scan. Fields the model doesn't know
+    about are kept in extra. to_dict() reproduces the stored JSON shape,
+    including key order, and the record can be read and written with
+    job["field"] like the plain dict it replaces.
+    """
+
+    # Serialization order of the known fields
+    FIELDS = (
+        "job_id", "prompt", "image_id", "created_at", "updated_at", "status",
+        "version", "progress", "current_step", "steps", "output"
+    )
+
+    __slots__ = FIELDS + ("extra", "_step_index")
+
+    def __init__(self, **fields: Any):
+        self.extra: Dict[str, Any] = {}
+        self._step_index: Dict[str, Step] = {}
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def new(cls, job_id: Optional[str], prompt: str, image_id: Optional[str], created_at: float) -> "Job":
+        """Create the record for a job that has not started yet."""
+        return cls(
+            job_id=job_id,
+            prompt=prompt,
+            image_id=image_id,
+            created_at=created_at,
+            updated_at=created_at,
+            status="pending",
+            version=1,
+            progress=0,
+            current_step="Job created, waiting to start",
+            steps=[Step(name, message=message) for name, message in DEFAULT_STEPS],
+            output={}
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Job":
+        return cls(**copy.deepcopy(data))
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {}
+        for key in self.FIELDS:
+            if not hasattr(self, key):
+                continue
+            if key == "steps":
+                data[key] = [step.to_dict() for step in self.steps]
+            else:
+                data[key] = copy.deepcopy(getattr(self, key))
+        for key, value in self.extra.items():
+            data[key] = copy.deepcopy(value)
+        return data
+
+    def step(self, name: str) -> Optional[Step]:
+        """Get a step by name."""
+        return self._step_index.get(name)
+
+    def apply_update(self, status: Optional[str] = None, **kwargs: Any) -> bool:
+        """
+        Apply a status update in the format used by update_job_status.
+
+        Args:
+            status (str, optional): New job status
+            **kwargs: progress, current_step and error update the job;
+                step_name selects a step whose step_status, step_progress and
+                step_message are updated
+
+        Returns:
+            bool: False if step_name was given but the job has no such step
+        """
+        if status:
+            self.status = _intern(status)
+
+        for key in ("progress", "current_step", "error"):
+            if key in kwargs:
+                self[key] = kwargs[key]
+
+        if "step_name" in kwargs:
+            step = self.step(kwargs["step_name"])
+            if step is None:
+                return False
+
+            for key in ("status", "progress", "message"):
+                step_key = f"step_{key}"
+                if step_key in kwargs:
+                    step[key] = kwargs[step_key]
+
+        return True
+
+    # Dict-style access so code written against the JSON shape keeps working
+    def __getitem__(self, key: str) -> Any:
+        if key in self.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return self.extra[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "steps":
+            steps = [step if isinstance(step, Step) else Step.from_dict(step) for step in value]
+            self.steps = steps
+            self._step_index = {step.name: step for step in steps}
+        elif key == "status":
+            self.status = _intern(value)
+        elif key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        if key in self.FIELDS:
+            return hasattr(self, key)
+        return key in self.extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
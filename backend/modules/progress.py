@@ -0,0 +1,154 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, Any, Optional
+
+from modules.database import update_job_status
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between progress writes of one job (0 writes every change). State
+# transitions are always written straight away
+PROGRESS_UPDATE_INTERVAL = float(os.environ.get('PROGRESS_UPDATE_INTERVAL', 1.0))
+
+# Keyword arguments of update_job_status that update the job and the named step
+JOB_FIELDS = ("progress", "current_step", "error")
+STEP_FIELDS = ("status", "progress", "message")
+
+_MISSING = object()
+
+class ProgressReporter:
+    """
+    Forwards one job's status updates to update_job_status, writing only
+    what changed and at most once per interval.
+
+    Takes the same arguments as update_job_status (without the job ID), so
+    it can be passed wherever a status_callback is expected. An update that
+    changes nothing is dropped. A change of the job's status, of a step's
+    status, or of the error is a state transition and is written straight
+    away, together with any progress still waiting. Other changes (progress,
+    current step, step messages) are merged and written once the interval
+    since the last write has passed, so a stage reporting every small
+    increment costs no more writes than one reporting rarely.
+    """
+
+    def __init__(self, job_id: str, interval: float = PROGRESS_UPDATE_INTERVAL,
+                 write: Optional[Callable[..., Any]] = None):
+        """
+        Initialize the reporter.
+
+        Args:
+            job_id (str): The job
+            interval (float): Minimum seconds between progress writes
+            write (callable, optional): Writes an update; defaults to update_job_status
+        """
+        self.job_id = job_id
+        self.interval = interval
+        self._write = write or update_job_status
+        self._lock = threading.RLock()
+        # Last reported values (written or waiting) of the job and of each step
+        self._job: Dict[str, Any] = {}
+        self._steps: Dict[str, Dict[str, Any]] = {}
+        self._pending_job: Dict[str, Any] = {}
+        self._pending_steps: Dict[str, Dict[str, Any]] = {}
+        self._last_write: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+        self.writes = 0
+        self.dropped = 0
+
+    def __call__(self, status: Optional[str] = None, **kwargs) -> None:
+        self.report(status, **kwargs)
+
+    def report(self, status: Optional[str] = None, **kwargs) -> None:
+        """Report a status update in the format used by update_job_status."""
+        step_name = kwargs.get("step_name")
+        job_fields = {key: kwargs[key] for key in JOB_FIELDS if key in kwargs}
+        if status:
+            job_fields["status"] = status
+        step_fields = {key: kwargs[f"step_{key}"] for key in STEP_FIELDS
+                       if step_name is not None and f"step_{key}" in kwargs}
+
+        with self._lock:
+            if self._closed:
+                return
+
+            job_changes = {key: value for key, value in job_fields.items()
+                           if self._job.get(key, _MISSING) != value}
+            step = self._steps.get(step_name, {})
+            step_changes = {key: value for key, value in step_fields.items()
+                            if step.get(key, _MISSING) != value}
+            if not job_changes and not step_changes:
+                self.dropped += 1
+                return
+
+            self._job.update(job_changes)
+            self._pending_job.update(job_changes)
+            if step_changes:
+                self._steps.setdefault(step_name, {}).update(step_changes)
+                self._pending_steps.setdefault(step_name, {}).update(step_changes)
+
+            transition = "status" in job_changes or "error" in job_changes or "status" in step_changes
+            now = time.monotonic()
+            if transition or self._last_write is None or now - self._last_write >= self.interval:
+                self._flush()
+            elif self._timer is None:
+                # Write the merged progress once the interval is up, even if nothing else is reported
+                timer = threading.Timer(self._last_write + self.interval - now, lambda: self._flush_later(timer))
+                timer.daemon = True
+                self._timer = timer
+                timer.start()
+
+    def _flush(self) -> None:
+        """Write the waiting changes; called with the lock held."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending_job and not self._pending_steps:
+            return
+
+        job_fields = dict(self._pending_job)
+        steps = list(self._pending_steps.items()) or [(None, {})]
+        self._pending_job.clear()
+        self._pending_steps.clear()
+        self._last_write = time.monotonic()
+
+        # update_job_status updates one step at a time
+        for step_name, step_fields in steps:
+            kwargs = {key: value for key, value in job_fields.items() if key != "status"}
+            if step_name is not None:
+                kwargs["step_name"] = step_name
+                kwargs.update({f"step_{key}": value for key, value in step_fields.items()})
+            self._write(self.job_id, job_fields.get("status"), **kwargs)
+            self.writes += 1
+            job_fields = {}
+
+    def _flush_later(self, timer: threading.Timer) -> None:
+        with self._lock:
+            # A write since the timer was set has taken its place
+            if self._timer is not timer or self._closed:
+                return
+            self._timer = None
+            try:
+                self._flush()
+            except Exception as e:
+                logger.error(f"Error writing progress of job {self.job_id}: {e}")
+
+    def flush(self) -> None:
+        """Write any waiting progress now."""
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        """Write any waiting progress and ignore later reports."""
+        with self._lock:
+            if self._closed:
+                return
+            try:
+                self._flush()
+            finally:
+                self._closed = True
+        logger.info(f"Job {self.job_id}: {self.writes} status writes, {self.dropped} no-op updates dropped")
@@ -0,0 +1,153 @@
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    Persistent index of finished jobs by job configuration.
+
+    Each entry maps a configuration key (see job_config.config_key) to the
+    completed job holding that configuration's result, so a later job with
+    the same configuration can reuse the result instead of running. Entries
+    expire ttl seconds after they were stored, and once the results indexed
+    exceed max_bytes the least recently used entries are evicted. Evicting
+    an entry only forgets it; the job it points to keeps its files.
+    """
+
+    def __init__(self, db_file: str, ttl: float = 7 * 24 * 3600, max_bytes: int = 10 * 1024 ** 3):
+        """
+        Initialize the cache.
+
+        Args:
+            db_file (str): Path to the SQLite database file
+            ttl (float): Seconds an entry stays valid; 0 disables expiry
+            max_bytes (int): Total result size kept before evicting; 0 disables the limit
+        """
+        self.db_file = db_file
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._hits = 0
+        self._misses = 0
+
+        conn = self._connect()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    job_id TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (last_used_at)")
+
+        logger.info(f"ResultCache initialized in {db_file} (ttl {ttl}s, max {max_bytes} bytes)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, opening it if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up the job holding a configuration's result, marking it used.
+
+        Returns:
+            str: The job ID, or None on a miss or an expired entry
+        """
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("SELECT job_id, created_at FROM results WHERE key = ?", (key,)).fetchone()
+        if row is not None and self.ttl and row[1] < now - self.ttl:
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            row = None
+        if row is None:
+            self._misses += 1
+            return None
+
+        conn.execute("UPDATE results SET last_used_at = ? WHERE key = ?", (now, key))
+        self._hits += 1
+        return row[0]
+
+    def put(self, key: str, job_id: str, size: int) -> List[str]:
+        """
+        Store a job as the result for a configuration, evicting as needed.
+
+        Args:
+            key (str): The configuration key
+            job_id (str): The completed job
+            size (int): Total size of the job's outputs in bytes
+
+        Returns:
+            list: Keys evicted to make room
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, job_id, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, job_id, size, now, now)
+            )
+            evicted = self._evict(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} cached results")
+        return evicted
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> List[str]:
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        evicted = []
+        if self.ttl:
+            evicted += [row[0] for row in conn.execute(
+                "SELECT key FROM results WHERE created_at < ?", (now - self.ttl,)
+            )]
+            conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl,))
+
+        if self.max_bytes:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_used_at").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    evicted.append(key)
+                    total -= size
+        return evicted
+
+    def discard(self, key: str) -> None:
+        """Forget a configuration's result, e.g. because its files are gone."""
+        self._connect().execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number and total size of cached results and this process's hit ratio."""
+        entries, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+        ).fetchone()
+        lookups = self._hits + self._misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": round(self._hits / lookups, 3) if lookups else 0
+        }
@@ -0,0 +1,124 @@
+import os
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Resource classes of pipeline stages
+IO = "io"
+CPU = "cpu"
+
+CPU_CORES = os.cpu_count() or 1
+
+# Network-bound stages (script and image generation) mostly wait on remote
+# APIs, so many run at once
+IO_POOL_SIZE = int(os.environ.get('IO_POOL_SIZE', 32))
+
+# CPU-bound stages (Blender renders, ffmpeg) run at most this many at once,
+# never more than there are cores
+RENDER_CONCURRENCY = max(1, min(int(os.environ.get('RENDER_CONCURRENCY', 2)), CPU_CORES))
+
+# Threads each Blender render may use; by default the cores are split evenly
+# between the CPU pool's slots
+BLENDER_THREADS = int(os.environ.get('BLENDER_THREADS', 0)) or max(1, CPU_CORES // RENDER_CONCURRENCY)
+
+class StageScheduler:
+    """
+    Runs pipeline stages in thread pools sized for their resource class.
+
+    Stages that wait on the network go to a wide I/O pool, so a slow remote
+    API only ties up cheap threads. Stages that burn CPU go to a pool with
+    one slot per concurrent render, and each render is given an equal share
+    of the cores, so the machine stays busy rendering while other jobs wait
+    on remote APIs, without renders oversubscribing the cores.
+    """
+
+    def __init__(self, io_workers: int = IO_POOL_SIZE, cpu_workers: int = RENDER_CONCURRENCY,
+                 render_threads: int = BLENDER_THREADS):
+        """
+        Initialize the scheduler.
+
+        Args:
+            io_workers (int): Size of the I/O pool
+            cpu_workers (int): Size of the CPU pool
+            render_threads (int): Threads given to each render
+        """
+        self.render_threads = render_threads
+        self._pools = {
+            IO: ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="stage-io"),
+            CPU: ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="stage-cpu"),
+        }
+        self._sizes = {IO: io_workers, CPU: cpu_workers}
+        self._lock = threading.Lock()
+        self._pending = {IO: 0, CPU: 0}
+        self._running = {IO: 0, CPU: 0}
+
+        logger.info(f"StageScheduler initialized with {io_workers} I/O and {cpu_workers} CPU slots "
+                    f"({render_threads} threads per render on {CPU_CORES} cores)")
+
+    def submit(self, resource_class: str, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Run a stage in the pool for its resource class.
+
+        Args:
+            resource_class (str): IO or CPU
+            fn (callable): The stage
+
+        Returns:
+            Future: The stage's result
+        """
+        pool = self._pools[resource_class]
+
+        def run():
+            with self._lock:
+                self._pending[resource_class] -= 1
+                self._running[resource_class] += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running[resource_class] -= 1
+
+        with self._lock:
+            self._pending[resource_class] += 1
+        future = pool.submit(run)
+
+        def done(future):
+            # A stage cancelled before it started never ran run()
+            if future.cancelled():
+                with self._lock:
+                    self._pending[resource_class] -= 1
+
+        future.add_done_callback(done)
+        return future
+
+    def run(self, resource_class: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run a stage in the pool for its resource class and wait for its result."""
+        return self.submit(resource_class, fn, *args, **kwargs).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the size, running and waiting stages of each pool."""
+        with self._lock:
+            return {
+                resource_class: {
+                    "size": self._sizes[resource_class],
+                    "running": self._running[resource_class],
+                    "waiting": self._pending[resource_class]
+                }
+                for resource_class in self._pools
+            }
+
+_scheduler: Optional[StageScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> StageScheduler:
+    """Get the process-wide scheduler, creating its pools on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = StageScheduler()
+        return _scheduler
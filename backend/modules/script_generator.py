@@ -3,32 +3,107 @@ import json
 import logging
 import requests
 import time
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import Dict, List, Any, Callable, Optional
 
+from modules.batcher import MicroBatcher
+from modules.cancellation import CancellationToken, JobCancelled
+from modules.deadline import Deadline
+from modules.job_config import SCRIPT_MODEL
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sampling parameters of every script request
+GENERATION_PARAMETERS = {
+    "max_new_tokens": 1024,
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "do_sample": True
+}
+
+# Script requests from jobs running at about the same time are sent to the
+# Inference API as one request with a list of inputs. A batch holds up to
+# SCRIPT_BATCH_SIZE prompts gathered for at most SCRIPT_BATCH_WAIT seconds;
+# SCRIPT_BATCH_SIZE=1 sends every prompt on its own
+SCRIPT_BATCH_SIZE = int(os.environ.get('SCRIPT_BATCH_SIZE', 8))
+SCRIPT_BATCH_WAIT = float(os.environ.get('SCRIPT_BATCH_WAIT', 0.2))
+# Seconds a batched request may take; generating several scripts takes longer than one
+SCRIPT_BATCH_TIMEOUT = float(os.environ.get('SCRIPT_BATCH_TIMEOUT', 120))
+
+def _generated_text(result: Any) -> str:
+    """Extract the generated text of one input from an Inference API response."""
+    if isinstance(result, list) and len(result) > 0:
+        result = result[0]
+    if isinstance(result, dict) and "generated_text" in result:
+        return result["generated_text"]
+    return result if isinstance(result, str) else str(result)
+
+def _api_headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {os.environ.get('HUGGINGFACE_API_KEY')}",
+        "Content-Type": "application/json"
+    }
+
+_batch_session = requests.Session()
+
+def _generate_batch(prompts: List[str]) -> List[str]:
+    """Generate the texts for several formatted prompts in one API request."""
+    response = _batch_session.post(
+        f"https://api-inference.huggingface.co/models/{SCRIPT_MODEL}",
+        headers=_api_headers(),
+        json={"inputs": prompts, "parameters": GENERATION_PARAMETERS},
+        timeout=SCRIPT_BATCH_TIMEOUT
+    )
+    response.raise_for_status()
+    results = response.json()
+    if not isinstance(results, list):
+        raise ValueError(f"Unexpected response to a batch of {len(prompts)} prompts: {results}")
+    return [_generated_text(result) for result in results]
+
+_script_batcher: Optional[MicroBatcher] = None
+_script_batcher_lock = threading.Lock()
+
+def get_script_batcher() -> MicroBatcher:
+    """Get the process-wide batcher of script requests."""
+    global _script_batcher
+    with _script_batcher_lock:
+        if _script_batcher is None:
+            _script_batcher = MicroBatcher(_generate_batch, max_batch=SCRIPT_BATCH_SIZE,
+                                           max_wait=SCRIPT_BATCH_WAIT, name="script-batch")
+        return _script_batcher
+
 class ScriptGenerator:
-    def __init__(self):
+    def __init__(self, cancel_token: Optional[CancellationToken] = None, deadline: Optional[Deadline] = None):
+        """
+        Initialize the ScriptGenerator.
+        
+        Args:
+            cancel_token (CancellationToken, optional): Token of the job the
+                script is for; cancelling it aborts the API call in flight
+            deadline (Deadline, optional): Deadline of the job; API calls
+                time out when it runs out
+        """
         logger.info("Initializing ScriptGenerator with Hugging Face")
+        self.cancel_token = cancel_token
+        self.deadline = deadline
+        self.session = requests.Session()
         # Set up Hugging Face API key
         self.api_key = os.environ.get('HUGGINGFACE_API_KEY')
         if not self.api_key:
             logger.warning("HUGGINGFACE_API_KEY environment variable not set")
             
         # Default model to use
-        self.model = os.environ.get('HUGGINGFACE_MODEL', 'mistralai/Mistral-7B-Instruct-v0.2')
+        self.model = SCRIPT_MODEL
         logger.info(f"Using Hugging Face model: {self.model}")
             
         # API endpoint
         self.api_url = f"https://api-inference.huggingface.co/models/{self.model}"
             
         # Headers for API requests
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        self.headers = _api_headers()
     
     def generate_script(self, prompt: str, status_callback: Optional[Callable] = None) -> Dict[str, Any]:
         """
@@ -99,6 +174,8 @@ class ScriptGenerator:
                 "status": "success",
                 "script": script
             }
+        except JobCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error generating script: {e}")
             
@@ -155,16 +232,6 @@ Make sure your response is valid JSON and includes at least 5-8 scenes. The tota
     
     def _call_huggingface_api(self, prompt: str, status_callback: Optional[Callable] = None) -> str:
         """Call the Hugging Face API to generate text."""
-        payload = {
-            "inputs": prompt,
-            "parameters": {
-                "max_new_tokens": 1024,
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "do_sample": True
-            }
-        }
-            
         # Make the API request
         max_retries = 3
         retry_delay = 5
@@ -181,15 +248,15 @@ Make sure your response is valid JSON and includes at least 5-8 scenes. The tota
                         step_progress=30 + attempt * 10
                     )
                     
-                response = requests.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=60  # Add timeout to prevent hanging requests
-                )
-                            
+                return self._request_text(prompt)
+                        
+            except requests.exceptions.RequestException as e:
+                # A request cut short by the deadline is not worth retrying
+                if self.deadline is not None:
+                    self.deadline.raise_if_expired()
+                
                 # Check if the model is still loading
-                if response.status_code == 503:
+                if getattr(e.response, "status_code", None) == 503:
                     logger.warning("Model is still loading. Waiting before retry...")
                     
                     if status_callback:
@@ -203,28 +270,10 @@ Make sure your response is valid JSON and includes at least 5-8 scenes. The tota
                             message="The language model is still loading. Waiting before retrying."
                         )
                         
-                    time.sleep(retry_delay)
+                    self._sleep(retry_delay)
                     retry_delay *= 2  # Exponential backoff
                     continue
-                            
-                # Check for other errors
-                response.raise_for_status()
-                            
-                # Parse the response
-                result = response.json()
-                            
-                # Extract the generated text
-                if isinstance(result, list) and len(result) > 0:
-                    if "generated_text" in result[0]:
-                        return result[0]["generated_text"]
-                    else:
-                        return result[0]
-                elif isinstance(result, dict) and "generated_text" in result:
-                    return result["generated_text"]
-                else:
-                    return str(result)
-                        
-            except requests.exceptions.RequestException as e:
+                
                 logger.error(f"API request failed (attempt {attempt+1}/{max_retries}): {e}")
                 
                 if status_callback:
@@ -240,9 +289,58 @@ Make sure your response is valid JSON and includes at least 5-8 scenes. The tota
                     
                 if attempt == max_retries - 1:
                     raise
-                time.sleep(retry_delay)
+                self._sleep(retry_delay)
                 retry_delay *= 2  # Exponential backoff
     
+    def _request_text(self, prompt: str) -> str:
+        """
+        Generate the text for a formatted prompt, batched with other jobs'
+        requests when batching is enabled.
+        
+        Raises:
+            requests.exceptions.RequestException: If the request failed
+        """
+        if SCRIPT_BATCH_SIZE > 1:
+            future = get_script_batcher().submit(prompt)
+            if self.cancel_token is None:
+                try:
+                    return future.result(timeout=self._timeout(None))
+                except FutureTimeoutError:
+                    # Only a deadline sets the timeout, so report it as one
+                    future.cancel()
+                    if self.deadline is not None:
+                        self.deadline.raise_if_expired()
+                    raise
+            # Cancelling leaves the prompt out of a batch that has not been sent
+            # yet; a batch already sent still completes for the other jobs
+            return self.cancel_token.call(future.result, abort=future.cancel)
+        
+        response = self._post(
+            self.api_url,
+            headers=self.headers,
+            json={"inputs": prompt, "parameters": GENERATION_PARAMETERS},
+            timeout=self._timeout(60)  # Add timeout to prevent hanging requests
+        )
+        response.raise_for_status()
+        return _generated_text(response.json())
+    
+    def _timeout(self, default: Optional[float]) -> Optional[float]:
+        """Cap a timeout at the time left to the job's deadline."""
+        return default if self.deadline is None else self.deadline.timeout(default)
+    
+    def _post(self, url: str, **kwargs):
+        """POST through the session, abandoning the request if the job is cancelled."""
+        if self.cancel_token is None:
+            return self.session.post(url, **kwargs)
+        return self.cancel_token.call(self.session.post, url, abort=self.session.close, **kwargs)
+    
+    def _sleep(self, seconds: float) -> None:
+        """Wait before a retry, waking up early if the job is cancelled."""
+        if self.cancel_token is None:
+            time.sleep(seconds)
+        else:
+            self.cancel_token.wait(seconds)
+    
     def _parse_response(self, response: str, original_prompt: str) -> Dict[str, Any]:
         """Parse the model's response to extract the script."""
         try:
@@ -0,0 +1,145 @@
+import os
+import mmap
+import time
+import zlib
+import struct
+import logging
+from typing import Dict, Any, Optional
+
+from modules.file_lock import FileLock
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# One slot: sequence counter, job ID, status, progress, version, updated_at
+SLOT = struct.Struct("<Q64s16sdqd")
+
+# Slots examined for a job before giving up
+MAX_PROBES = 32
+
+class SharedStatusTable:
+    """
+    Fixed-size table of job statuses in a memory-mapped file.
+
+    Every process that maps the file sees the latest status, progress and
+    version of each job without reading the job store. Slots are found by
+    open addressing on a stable hash of the job ID. Writers are serialized
+    with a FileLock; readers take no lock and instead use the slot's sequence
+    counter (odd while a write is in progress) to detect and retry torn reads.
+
+    When every slot a job could use is taken by an active job, the job is not
+    tracked and readers fall back to the job store. Slots of finished jobs
+    are reused, oldest first.
+    """
+
+    # Statuses whose slots may be reused for other jobs
+    REUSABLE_STATUSES = {"completed", "error", "cancelled", "canceled"}
+
+    def __init__(self, path: str, slots: int = 65536):
+        """
+        Initialize the table, creating the file if needed.
+
+        Args:
+            path (str): Path of the table file
+            slots (int): Number of slots; fixed once the file exists
+        """
+        self.path = path
+        self._write_lock = FileLock(f"{path}.lock")
+
+        size = slots * SLOT.size
+        with self._write_lock:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < size:
+                    os.ftruncate(fd, size)
+                size = os.fstat(fd).st_size
+                self._map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+
+        self.slots = size // SLOT.size
+        logger.info(f"SharedStatusTable mapped {self.slots} slots from {path}")
+
+    def _probe(self, job_id: str):
+        start = zlib.crc32(job_id.encode()) % self.slots
+        for i in range(min(MAX_PROBES, self.slots)):
+            yield (start + i) % self.slots
+
+    def _read_slot(self, index: int) -> tuple:
+        """Read a slot consistently, retrying while a writer is active."""
+        offset = index * SLOT.size
+        while True:
+            values = SLOT.unpack_from(self._map, offset)
+            if values[0] % 2 == 0 and struct.unpack_from("<Q", self._map, offset)[0] == values[0]:
+                return values
+            time.sleep(0)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job's shared status.
+
+        Returns:
+            dict: status, progress, version and updated_at, or None if the
+                job is not in the table
+        """
+        key = job_id.encode()
+        for index in self._probe(job_id):
+            _, slot_id, status, progress, version, updated_at = self._read_slot(index)
+            slot_id = slot_id.rstrip(b"\0")
+            if slot_id == key:
+                return {
+                    "status": status.rstrip(b"\0").decode(),
+                    "progress": progress,
+                    "version": version,
+                    "updated_at": updated_at
+                }
+            if not slot_id:
+                return None
+        return None
+
+    def version(self, job_id: str) -> int:
+        """Get a job's shared version, or 0 if the job is not in the table."""
+        entry = self.get(job_id)
+        return entry["version"] if entry else 0
+
+    def put(self, job_id: str, status: str, progress: float, version: int, updated_at: float) -> bool:
+        """
+        Publish a job's status.
+
+        Returns:
+            bool: False if no slot was available for the job
+        """
+        key = job_id.encode()
+        if len(key) > 64:
+            return False
+
+        with self._write_lock:
+            target = None
+            reusable = None
+            for index in self._probe(job_id):
+                _, slot_id, slot_status, _, _, slot_updated = SLOT.unpack_from(self._map, index * SLOT.size)
+                slot_id = slot_id.rstrip(b"\0")
+                if slot_id == key or not slot_id:
+                    target = index
+                    break
+                if slot_status.rstrip(b"\0").decode() in self.REUSABLE_STATUSES:
+                    if reusable is None or slot_updated < reusable[1]:
+                        reusable = (index, slot_updated)
+
+            if target is None:
+                if reusable is None:
+                    logger.warning(f"Shared status table full around job {job_id}")
+                    return False
+                target = reusable[0]
+
+            offset = target * SLOT.size
+            seq = struct.unpack_from("<Q", self._map, offset)[0]
+            # Odd sequence marks the slot as being written
+            struct.pack_into("<Q", self._map, offset, seq + 1)
+            SLOT.pack_into(
+                self._map, offset, seq + 1, key,
+                (status or "").encode()[:16], float(progress or 0), int(version), float(updated_at or 0)
+            )
+            struct.pack_into("<Q", self._map, offset, seq + 2)
+        return True
@@ -0,0 +1,150 @@
+import time
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, List, Any, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Tracks which job is producing the result for each job configuration.
+
+    The first job submitted for a configuration key becomes the flight's
+    leader and runs the pipeline. Jobs submitted with the same key while the
+    leader is in flight join as followers; they never run and receive the
+    leader's result once it finishes. Flights live in SQLite so every
+    process sharing the database sees them.
+    """
+
+    def __init__(self, db_file: str):
+        """
+        Initialize the flight table.
+
+        Args:
+            db_file (str): Path to the SQLite database file
+        """
+        self.db_file = db_file
+        self._local = threading.local()
+
+        conn = self._connect()
+        with conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS flights (
+                    key TEXT PRIMARY KEY,
+                    leader_id TEXT NOT NULL UNIQUE,
+                    started_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS flight_followers (
+                    job_id TEXT PRIMARY KEY,
+                    leader_id TEXT NOT NULL,
+                    joined_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_flight_followers_leader ON flight_followers (leader_id)")
+
+        logger.info(f"SingleFlight initialized in {db_file}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the connection for the current thread, opening it if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def join(self, key: str, job_id: str, is_active: Callable[[str], bool]) -> Optional[str]:
+        """
+        Join the flight for a key, starting it if there is none.
+
+        A flight whose leader is no longer active (e.g. it was lost before
+        reporting its result) is taken over: job_id becomes its leader and
+        inherits its followers.
+
+        Args:
+            key (str): The job configuration key
+            job_id (str): The job joining
+            is_active (callable): Whether a leader job is still in flight
+
+        Returns:
+            str: The leader's job ID if job_id joined as a follower, or None
+                if job_id is the leader and has to run
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT leader_id FROM flights WHERE key = ?", (key,)).fetchone()
+            if row is not None and is_active(row[0]):
+                conn.execute(
+                    "INSERT OR REPLACE INTO flight_followers (job_id, leader_id, joined_at) VALUES (?, ?, ?)",
+                    (job_id, row[0], time.time())
+                )
+                conn.execute("COMMIT")
+                return row[0]
+
+            if row is not None:
+                logger.warning(f"Job {job_id} takes over the flight of inactive job {row[0]}")
+                conn.execute("UPDATE flight_followers SET leader_id = ? WHERE leader_id = ?", (job_id, row[0]))
+                conn.execute("DELETE FROM flights WHERE key = ?", (key,))
+            conn.execute(
+                "INSERT INTO flights (key, leader_id, started_at) VALUES (?, ?, ?)",
+                (key, job_id, time.time())
+            )
+            conn.execute("COMMIT")
+            return None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def leave(self, job_id: str) -> bool:
+        """
+        Detach a follower, e.g. because it was cancelled.
+
+        Returns:
+            bool: True if job_id was following a flight
+        """
+        cursor = self._connect().execute("DELETE FROM flight_followers WHERE job_id = ?", (job_id,))
+        return cursor.rowcount > 0
+
+    def leader_of(self, job_id: str) -> Optional[str]:
+        """Get the leader a job follows, or None if it isn't a follower."""
+        row = self._connect().execute(
+            "SELECT leader_id FROM flight_followers WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def finish(self, leader_id: str) -> List[str]:
+        """
+        End a leader's flight.
+
+        Returns:
+            list: The followers that were waiting for the leader's result, in
+                the order they joined
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            followers = [row[0] for row in conn.execute(
+                "SELECT job_id FROM flight_followers WHERE leader_id = ? ORDER BY joined_at", (leader_id,)
+            )]
+            conn.execute("DELETE FROM flight_followers WHERE leader_id = ?", (leader_id,))
+            conn.execute("DELETE FROM flights WHERE leader_id = ?", (leader_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return followers
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of flights in progress and of jobs following them."""
+        conn = self._connect()
+        return {
+            "flights": conn.execute("SELECT COUNT(*) FROM flights").fetchone()[0],
+            "followers": conn.execute("SELECT COUNT(*) FROM flight_followers").fetchone()[0]
+        }
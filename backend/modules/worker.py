@@ -0,0 +1,245 @@
+import os
+import time
+import signal
+import logging
+import argparse
+import threading
+from typing import Dict, Any
+
+from dotenv import load_dotenv
+
+# Load environment variables before the modules below read their configuration
+load_dotenv()
+
+from modules.database import get_job, get_job_status, update_job, update_job_status, recover_jobs, claim_recovery, start_archival, DATA_DIR
+from modules.job_store import TERMINAL_STATUSES
+from modules.job_queue import JobQueue, QueueFullError
+from modules.job_config import config_key
+from modules.job_processor import process_job, materialize_outputs, complete_from_cache
+from modules.single_flight import SingleFlight
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Jobs run at once per worker process. Their stages run on the scheduler's
+# pools, so a job thread mostly waits and this can exceed the core count. At
+# most JOB_QUEUE_MAX_DEPTH jobs may wait before submissions are rejected with 429
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 8))
+JOB_QUEUE_MAX_DEPTH = int(os.environ.get('JOB_QUEUE_MAX_DEPTH', 100))
+JOB_QUEUE_DB = os.path.join(DATA_DIR, 'queue.db')
+
+# Seconds a worker may go without a heartbeat before its jobs are re-run elsewhere
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 60))
+# Times a job is re-run after its worker died before it is failed
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+# Seconds a stopping worker waits for its running jobs
+WORKER_SHUTDOWN_TIMEOUT = float(os.environ.get('WORKER_SHUTDOWN_TIMEOUT', 30))
+
+# Identical jobs in flight share one pipeline run
+flights = SingleFlight(JOB_QUEUE_DB)
+
+def create_job_queue(workers: int = 0) -> JobQueue:
+    """
+    Open the shared job queue.
+
+    Args:
+        workers (int): Worker threads started by start(); 0 for a queue that
+            is only used to submit jobs
+
+    Returns:
+        JobQueue: The queue
+    """
+    job_queue = JobQueue(JOB_QUEUE_DB,
+                         (lambda job_id, wait: run_queued_job(job_queue, job_id, wait)) if workers else None,
+                         workers=workers,
+                         max_depth=JOB_QUEUE_MAX_DEPTH,
+                         lease_duration=JOB_LEASE_SECONDS,
+                         max_attempts=JOB_MAX_ATTEMPTS,
+                         on_abandoned=lambda job_id: fail_abandoned_job(job_queue, job_id))
+    return job_queue
+
+def _in_flight(job_id: str) -> bool:
+    """Check whether a job has yet to finish."""
+    status = get_job_status(job_id) or get_job(job_id)
+    return status is not None and status.get("status") not in TERMINAL_STATUSES
+
+def enqueue_job(job_queue: JobQueue, job_id: str, priority: int = 0, bounded: bool = True,
+                force_regenerate: bool = False) -> Dict[str, Any]:
+    """
+    Queue a job, unless an identical job's result can be used instead.
+
+    Jobs are identical when their normalized prompt, image and generation
+    parameters match. A job whose configuration has a cached result is
+    completed with it right away. A job identical to one already in flight
+    is attached to it; it is never run and receives that job's result when
+    it finishes.
+
+    Args:
+        job_queue (JobQueue): The queue
+        job_id (str): The job ID
+        priority (int): Queue priority
+        bounded (bool): Enforce the queue's maximum depth
+        force_regenerate (bool): Always run the job, ignoring cached and
+            in-flight results
+
+    Returns:
+        dict: {"position": queue position, or None if not queued,
+               "depth": waiting jobs, "coalesced_with": the followed job or None,
+               "cached": whether the job was completed from the cache}
+
+    Raises:
+        QueueFullError: If the job has to run and the queue is full
+    """
+    job = get_job(job_id)
+    key = job.get("config_key") or config_key(job["prompt"], job.get("image_id"))
+    force_regenerate = force_regenerate or job.get("force_regenerate", False)
+
+    leader_id = None
+    if not force_regenerate:
+        if complete_from_cache(job_id, key):
+            return {"position": None, "depth": job_queue.depth(), "coalesced_with": None, "cached": True}
+        leader_id = flights.join(key, job_id, _in_flight)
+
+    def record(job):
+        # An identical job that finished since we joined it has already settled this one
+        if job.get("status") in TERMINAL_STATUSES:
+            return
+        job["config_key"] = key
+        job["coalesced_with"] = leader_id
+        if force_regenerate:
+            job["force_regenerate"] = True
+        if leader_id:
+            job["current_step"] = f"Waiting for identical job {leader_id}"
+
+    update_job(job_id, record)
+    if leader_id:
+        logger.info(f"Job {job_id} attached to identical job {leader_id}")
+        return {"position": None, "depth": job_queue.depth(), "coalesced_with": leader_id, "cached": False}
+
+    try:
+        queued = job_queue.enqueue(job_id, priority, bounded=bounded)
+    except QueueFullError:
+        # Jobs that attached in the meantime get a flight of their own
+        settle_flight(job_queue, job_id)
+        raise
+    return {**queued, "coalesced_with": None, "cached": False}
+
+def settle_flight(job_queue: JobQueue, leader_id: str) -> None:
+    """
+    Hand a finished job's outcome to the identical jobs that followed it.
+
+    Followers of a completed job are completed with links to its outputs,
+    and followers of a failed job fail the same way. Followers of a job that
+    was cancelled, or never ran, are queued again, the first one running in
+    its place.
+    """
+    followers = flights.finish(leader_id)
+    if not followers:
+        return
+
+    leader = get_job(leader_id)
+    status = leader.get("status") if leader else None
+    if status == "completed":
+        for job_id in followers:
+            try:
+                materialize_outputs(leader, job_id, f"Completed with the result of identical job {leader_id}")
+            except Exception as e:
+                logger.error(f"Error giving job {job_id} the result of job {leader_id}: {e}")
+                update_job_status(job_id, "error", error=str(e), current_step="Error copying the result of an identical job")
+    elif status == "error":
+        for job_id in followers:
+            update_job_status(job_id, "error",
+                              error=leader.get("error"),
+                              current_step=f"Identical job {leader_id} failed")
+    else:
+        for job_id in followers:
+            job = get_job(job_id)
+            if job and job.get("status") not in TERMINAL_STATUSES:
+                enqueue_job(job_queue, job_id, job.get("priority", 0), bounded=False)
+
+def run_queued_job(job_queue: JobQueue, job_id: str, wait: float) -> None:
+    """Run a job taken off the queue, recording how long it waited."""
+    try:
+        job = get_job(job_id)
+        if not job or job.get("status") in TERMINAL_STATUSES:
+            logger.info(f"Skipping queued job {job_id} (status: {job.get('status') if job else 'missing'})")
+            return
+
+        def started(job):
+            job["started_at"] = time.time()
+            job["queue_wait"] = round(wait, 3)
+
+        update_job(job_id, started)
+        process_job(job_id)
+    finally:
+        settle_flight(job_queue, job_id)
+
+def fail_abandoned_job(job_queue: JobQueue, job_id: str) -> None:
+    """Fail a job whose workers kept dying while running it."""
+    update_job_status(job_id, "error",
+                      error="Job's worker stopped responding too many times",
+                      current_step="Interrupted by worker restarts")
+    settle_flight(job_queue, job_id)
+
+def recover_orphaned_jobs(job_queue: JobQueue) -> None:
+    """
+    Re-queue in-flight jobs that are not in the queue at all.
+
+    Jobs in the queue, waiting or leased, are left alone: a lapsed lease
+    already hands them to another worker. Jobs following an identical job
+    are left to it. This only picks up jobs that were in flight when the
+    queue had no entry for them, e.g. from before the queue existed.
+    """
+    # Only one process recovers, so two workers don't queue the same jobs
+    if not claim_recovery():
+        logger.info("Another process handles job recovery")
+        return
+
+    try:
+        recovered = recover_jobs(skip=lambda job_id: job_id in job_queue or flights.leader_of(job_id) is not None)
+    except Exception as e:
+        logger.error(f"Error recovering in-flight jobs: {str(e)}")
+        return
+
+    for job_id in recovered["resumed"]:
+        job = get_job(job_id) or {}
+        job_queue.enqueue(job_id, job.get("priority", 0), bounded=False)
+
+def main() -> None:
+    """
+    Run a worker process until SIGTERM or SIGINT.
+    
+    Start it with `python -m modules.worker` from the backend directory. The
+    worker claims jobs from the shared queue in DATA_DIR and runs them, so any
+    number of workers can run per host and be restarted without touching the
+    API. A job whose worker stops is re-run by another worker once its lease
+    expires, resuming from its checkpoints.
+    """
+    parser = argparse.ArgumentParser(description="Run ImagineIt jobs from the shared queue")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS,
+                        help=f"jobs run at once by this process (default {JOB_WORKERS})")
+    args = parser.parse_args()
+
+    job_queue = create_job_queue(workers=args.workers)
+    recover_orphaned_jobs(job_queue)
+    start_archival()
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        logger.info(f"Received signal {signum}, stopping after running jobs")
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    job_queue.start()
+    logger.info(f"Worker {job_queue.worker_id} running {args.workers} jobs at a time")
+
+    stopping.wait()
+    job_queue.stop(timeout=WORKER_SHUTDOWN_TIMEOUT)
+    logger.info(f"Worker {job_queue.worker_id} stopped")
+
+if __name__ == '__main__':
+    main()
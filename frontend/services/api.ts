@@ -1,12 +1,20 @@
-import { Job, JobStatusInfo, GenerateResult } from '@/types';
+import { Job, JobStatusInfo, GenerateResult, BatchResult } from '@/types';
 
 // Base API URL
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:5000';
 
-// Fetch all jobs
-export const fetchJobs = async (): Promise<{ status: string; jobs: Job[] }> => {
+// Fetch a page of jobs, newest first
+export const fetchJobs = async (
+  params: { limit?: number; cursor?: string; status?: string } = {}
+): Promise<{ status: string; jobs: Job[]; next_cursor?: string | null }> => {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/jobs`);
+    const query = new URLSearchParams();
+    if (params.limit) query.set('limit', String(params.limit));
+    if (params.cursor) query.set('cursor', params.cursor);
+    if (params.status) query.set('status', params.status);
+    const queryString = query.toString();
+    
+    const response = await fetch(`${API_BASE_URL}/api/jobs${queryString ? `?${queryString}` : ''}`);
     
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
@@ -40,16 +48,23 @@ export const fetchJobStatus = async (jobId: string): Promise<{ status: string; j
 
 
 // Create a new job
-export const createJob = async (prompt: string): Promise<GenerateResult> => {
+// forceRegenerate runs the pipeline even when an identical job's result could be reused
+export const createJob = async (prompt: string, forceRegenerate = false): Promise<GenerateResult> => {
   try {
     const response = await fetch(`${API_BASE_URL}/api/job`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({ prompt }),
+      body: JSON.stringify({ prompt, force_regenerate: forceRegenerate }),
     });
     
+    // The server rejects new jobs while its queue is full
+    if (response.status === 429) {
+      const body = await response.json();
+      throw new Error(body.message || 'Too many jobs waiting, try again later');
+    }
+    
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
     }
@@ -61,6 +76,54 @@ export const createJob = async (prompt: string): Promise<GenerateResult> => {
   }
 };
 
+// Create one job per prompt in a single request
+export const createJobBatch = async (prompts: string[], forceRegenerate = false): Promise<BatchResult> => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/jobs/batch`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ prompts, force_regenerate: forceRegenerate }),
+    });
+    
+    // The whole batch is rejected unless the queue has room for all of it
+    if (response.status === 429) {
+      const body = await response.json();
+      throw new Error(body.message || 'Too many jobs waiting, try again later');
+    }
+    
+    if (!response.ok) {
+      const body = await response.json().catch(() => ({}));
+      throw new Error(body.message || `HTTP error! status: ${response.status}`);
+    }
+    
+    return await response.json();
+  } catch (error) {
+    console.error('Error creating job batch:', error);
+    throw error;
+  }
+};
+
+// Resume a failed or cancelled job from its last checkpoint
+export const resumeJob = async (jobId: string): Promise<GenerateResult> => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/job/${jobId}/resume`, {
+      method: 'POST',
+    });
+    
+    if (!response.ok) {
+      const body = await response.json().catch(() => ({}));
+      throw new Error(body.message || `HTTP error! status: ${response.status}`);
+    }
+    
+    return await response.json();
+  } catch (error) {
+    console.error('Error resuming job:', error);
+    throw error;
+  }
+};
+
 // Cancel a job
 export const cancelJob = async (jobId: string): Promise<{ status: string; message: string }> => {
   try {
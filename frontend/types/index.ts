@@ -24,6 +24,23 @@ export interface GenerateResult {
   message: string;
   job_id?: string;
   error?: string;
+  queue_position?: number | null;
+  queue_depth?: number;
+  coalesced_with?: string | null;
+  cached?: boolean;
+}
+
+// Result of a batch submission
+export interface BatchResult {
+  status: string;
+  message: string;
+  jobs: {
+    job_id: string;
+    queue_position: number | null;
+    queue_depth: number;
+    coalesced_with: string | null;
+    cached: boolean;
+  }[];
 }
 
 // Platform type for publishing
@@ -77,6 +94,16 @@ export interface JobStatusInfo {
     assets?: string[];
     video_url?: string;
   };
+  queue_position?: number | null;
+  queue_wait?: number | null;
+  coalesced_with?: string | null;
+  materialized_from?: string | null;
+  deadline_exceeded?: {
+    scope: 'job' | 'stage';
+    stage: string;
+    budget: number;
+    elapsed: number;
+  } | null;
   createdAt: string;
 }
 